@@ -0,0 +1,219 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# Event-loop lag above this makes the controller shed the lowest-priority work
+ADMISSION_LOOP_LAG_TARGET_SECONDS = float(os.getenv("ADMISSION_LOOP_LAG_TARGET_SECONDS", "0.05"))
+ADMISSION_ADJUST_INTERVAL_SECONDS = 0.25
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request would wait longer than its class's queue budget."""
+
+    def __init__(self, priority_class: str, retry_after: float):
+        super().__init__(f"{priority_class} requests are over capacity")
+        self.priority_class = priority_class
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class PriorityClass:
+    """
+    Concurrency limit plus FIFO queue for one class of routes.
+
+    `limit` moves between min_limit and max_limit: it is cut when the class's
+    own latency exceeds `target_latency` or, for lower priorities, when the
+    event loop lags; it grows by one while the class is saturated and healthy.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        max_limit: int,
+        min_limit: int,
+        queue_budget: float,
+        target_latency: float,
+    ):
+        self.name = name
+        self.priority = priority
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.queue_budget = queue_budget
+        self.target_latency = target_latency
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.latency = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.counts = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def _estimated_wait(self) -> float:
+        # Little's law: everyone ahead of us drains at limit / latency per second
+        return (len(self._waiters) + 1) * self.latency / max(1.0, self.limit)
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.counts["admitted"] += 1
+            return
+        estimate = self._estimated_wait()
+        if estimate > self.queue_budget:
+            self.counts["rejected"] += 1
+            raise Overloaded(self.name, estimate)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counts["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_budget)
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we gave up (timeout or client gone)
+                self.in_flight -= 1
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.counts["timed_out"] += 1
+                raise Overloaded(self.name, self._estimated_wait())
+            raise
+        # The slot was handed over by release()
+        self.counts["admitted"] += 1
+
+    def release(self, latency: float):
+        self.in_flight -= 1
+        self.latency = latency if self.latency == 0 else (1 - _EWMA_ALPHA) * self.latency + _EWMA_ALPHA * latency
+        if self.latency > self.target_latency:
+            # At most once per observed latency, so one slow burst is not counted repeatedly
+            self.decrease(0.9, max(self.latency, ADMISSION_ADJUST_INTERVAL_SECONDS))
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def decrease(self, factor: float, every: float):
+        now = time.monotonic()
+        if now - self._last_decrease < every:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+    def increase(self):
+        if self.in_flight >= int(self.limit) - 1 and self.latency <= self.target_latency:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+            self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued_now": len(self._waiters),
+            "latency_ewma_seconds": round(self.latency, 4),
+            **self.counts,
+        }
+
+
+class AdmissionController:
+    """
+    Per-class admission with priority-aware adaptive limits.
+
+    A background task measures event-loop lag. While the loop lags, the
+    lowest-priority class still above its minimum has its limit cut, so
+    cheap reads and money-moving writes keep the loop ahead of LLM-bound
+    work. Otherwise saturated, healthy classes grow back toward their maximum.
+    """
+
+    def __init__(self, classes: list[PriorityClass], lag_target: float = ADMISSION_LOOP_LAG_TARGET_SECONDS):
+        self.classes = {c.name: c for c in classes}
+        # Lowest priority (largest number) first
+        self._shed_order = sorted(classes, key=lambda c: -c.priority)
+        self.lag_target = lag_target
+        self.loop_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _adjust(self):
+        if self.loop_lag > self.lag_target:
+            for cls in self._shed_order:
+                if cls.limit > cls.min_limit and cls.in_flight > 0:
+                    # Cut harder the further the loop is behind
+                    cls.decrease(max(0.5, min(0.9, self.lag_target / self.loop_lag)), ADMISSION_ADJUST_INTERVAL_SECONDS)
+                    return
+            return
+        for cls in self.classes.values():
+            cls.increase()
+
+    async def _monitor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(ADMISSION_ADJUST_INTERVAL_SECONDS)
+            lag = loop.time() - started - ADMISSION_ADJUST_INTERVAL_SECONDS
+            self.loop_lag = max(0.0, lag)
+            self._adjust()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "loop_lag_seconds": round(self.loop_lag, 4),
+            "classes": {name: cls.stats() for name, cls in self.classes.items()},
+        }
+
+
+def _limit(name: str, default: int) -> int:
+    return int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", str(default)))
+
+
+def default_classes() -> list[PriorityClass]:
+    """
+    critical: on-chain writes (move money; wait for confirmation)
+    read: cached and RPC-backed reads
+    llm: /chat, bounded further by the LLM governor
+    """
+    return [
+        PriorityClass("critical", 0, _limit("critical", 64), 8, queue_budget=3.0, target_latency=10.0),
+        PriorityClass("read", 1, _limit("read", 256), 16, queue_budget=0.5, target_latency=0.5),
+        PriorityClass("llm", 2, _limit("llm", 32), 2, queue_budget=1.0, target_latency=5.0),
+    ]
+
+
+# Long-lived streams and operational endpoints are never queued or shed
+_EXEMPT = {"/", "/metrics", "/markets/subscribe", "/jobs/stream"}
+# GET routes that hold ?wait=N long-polls (main._conditional_get)
+_LONG_POLL_ROUTES = {"/markets", "/stats"}
+
+
+def classify(method: str, path: str, long_poll: bool = False) -> Optional[str]:
+    """
+    Priority class of a request, or None if it bypasses admission control.
+    `long_poll` means the request has ?wait=N and If-None-Match. Such GETs
+    on long-poll routes are exempt: they mostly sleep on a change event,
+    and counting that hold as latency would shrink the read limit.
+    """
+    if path in _EXEMPT or path.startswith("/debug/"):
+        return None
+    if long_poll and method == "GET" and path in _LONG_POLL_ROUTES:
+        return None
+    if path == "/chat":
+        return "llm"
+    if method == "POST" and path.startswith("/market/"):
+        return "critical"
+    return "read"
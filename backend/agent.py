@@ -1,28 +1,21 @@
 from solana_client import BizMartOrchestrator
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
+from llm_governor import get_governor
+from tracing import span, traced
 import asyncio
 import os
 
 load_dotenv()
 
+# Number of user messages kept when a session is serialized
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "20"))
+
 class BizMartAgent:
     def __init__(self):
-        openrouter_key = os.getenv("OPENROUTER_API_KEY")
-        openrouter_base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
-        openrouter_model = os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-120b:free")
-        if not openrouter_key:
-            raise ValueError("OPENROUTER_API_KEY is not set in .env")
-        self.llm = ChatOpenAI(
-            model=openrouter_model,
-            api_key=openrouter_key,
-            base_url=openrouter_base,
-            default_headers={
-                "HTTP-Referer": os.getenv("OPENROUTER_SITE_URL", "http://localhost:8000"),
-                "X-Title": os.getenv("OPENROUTER_APP_NAME", "BizFi"),
-            },
-        )
+        # One pooled client, concurrency cap and circuit breaker for all sessions
+        self.llm_governor = get_governor()
+        self.llm = self.llm_governor.llm
         self.orchestrator = BizMartOrchestrator()
         self.system_prompt = (
             "You are $BizMart, a savvy AI agent helping tokenize ideas, businesses, and careers. "
@@ -82,6 +75,7 @@ class BizMartAgent:
         ]
         self._intro_sent = True
 
+    @traced("agent.chat")
     async def chat(self, user_input: str):
         self.chat_history.append(HumanMessage(content=user_input))
 
@@ -102,7 +96,8 @@ class BizMartAgent:
             return await self._launch_sequence()
         # Hybrid flow: store data deterministically, but use LLM to add tone.
         # Strict mode: enforce one labeled field per message
-        strict_result = self._store_answer_strict(user_input)
+        with span("agent.store_answer", step=self.step):
+            strict_result = self._store_answer_strict(user_input)
         if strict_result:
             return strict_result
         self._fast_forward_step()
@@ -118,11 +113,7 @@ class BizMartAgent:
             "Do not change its meaning or add new questions. Output only the rewritten question.\n\n"
             f"Question: {base_question}"
         )
-        try:
-            response = await self.llm.ainvoke([SystemMessage(content=prompt)])
-            return response.content.strip()
-        except Exception:
-            return base_question
+        return await self.llm_governor.complete([SystemMessage(content=prompt)], fallback=base_question)
 
     def _ready_to_launch(self) -> bool:
         required = ["name", "wallet", "prediction_question", "duration", "chain"]
@@ -274,6 +265,28 @@ class BizMartAgent:
         missing = [k for k in order if not self.collected_data.get(k)]
         return {"collected": self.collected_data, "missing": missing}
 
+    def to_state(self) -> dict:
+        """
+        Compact, JSON-serializable session state (no LangChain objects).
+        The system prompt is constant and is not stored.
+        """
+        history = [m.content for m in self.chat_history if isinstance(m, HumanMessage)]
+        return {
+            "h": history[-SESSION_HISTORY_LIMIT:],
+            "d": {k: v for k, v in self.collected_data.items() if v},
+            "s": self.step,
+        }
+
+    def load_state(self, state: dict):
+        """
+        Restore a session produced by to_state().
+        """
+        self.reset_state()
+        self.collected_data.update(state.get("d", {}))
+        self.step = state.get("s", 1)
+        self.chat_history = [SystemMessage(content=self.system_prompt)]
+        self.chat_history.extend(HumanMessage(content=text) for text in state.get("h", []))
+
     def _extract_data_attempt(self, user_text: str, bot_text: str):
         """Basic parsing for demo; in production use LLM function calling"""
         # Extract wallet address
@@ -301,6 +314,7 @@ class BizMartAgent:
             if vibe in user_text.lower():
                 self.collected_data["vibe"] = vibe.capitalize()
 
+    @traced("agent.launch_sequence")
     async def _launch_sequence(self):
         # 1. Verify payment (mock for demo)
         paid = await self.orchestrator.check_fee_payment(self.collected_data.get("wallet", "Unknown"))
@@ -0,0 +1,186 @@
+import heapq
+import os
+from collections import defaultdict
+from typing import Optional
+
+from market_state import MarketAccount, PositionAccount
+
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+USDC_DECIMALS = 6
+
+
+class TopK:
+    """
+    Top-K keys by score over values that change over time.
+
+    Uses a max-heap with lazy deletion: every update pushes a new entry and
+    stale entries are discarded when they surface, so updates are O(log n)
+    and reading the top K is O(K log n).
+    """
+
+    def __init__(self):
+        self._scores: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+
+    def update(self, key: str, score: int):
+        if score == 0:
+            self._scores.pop(key, None)
+        else:
+            self._scores[key] = score
+            heapq.heappush(self._heap, (-score, key))
+        if len(self._heap) > 2 * len(self._scores) + 64:
+            self._heap = [(-s, k) for k, s in self._scores.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int) -> list[tuple[str, int]]:
+        result: list[tuple[str, int]] = []
+        kept: list[tuple[int, str]] = []
+        seen = set()
+        while self._heap and len(result) < k:
+            entry = heapq.heappop(self._heap)
+            neg_score, key = entry
+            if key in seen or self._scores.get(key) != -neg_score:
+                continue
+            seen.add(key)
+            kept.append(entry)
+            result.append((key, -neg_score))
+        for entry in kept:
+            heapq.heappush(self._heap, entry)
+        return result
+
+
+def realized_pnl(market: Optional[MarketAccount], position: PositionAccount) -> int:
+    """
+    Realized P&L of a position in base units; zero until the market resolves.
+    Mirrors the payout formula of claim_winnings.
+    """
+    if market is None or market.status != "Resolved":
+        return 0
+    stake = position.yes_amount + position.no_amount
+    winning_stake = position.yes_amount if market.outcome else position.no_amount
+    winning_pool = market.yes_pool if market.outcome else market.no_pool
+    payout = winning_stake * market.total_pool // winning_pool if winning_pool else 0
+    return payout - stake
+
+
+def format_usdc(amount: int) -> str:
+    return f"{amount / 10 ** USDC_DECIMALS:,.0f} USDC"
+
+
+class AggregatesEngine:
+    """
+    Platform stats and trader leaderboards maintained incrementally from
+    account changes (register `on_change` as a MarketStateStore listener).
+    """
+
+    def __init__(self, leaderboard_size: int = LEADERBOARD_SIZE):
+        self.leaderboard_size = leaderboard_size
+        self.total_volume = 0
+        self.active_markets = 0
+        self.markets_resolved = 0
+        self._markets: dict[str, MarketAccount] = {}
+        self._positions: dict[str, PositionAccount] = {}
+        self._positions_by_market: dict[str, set[str]] = defaultdict(set)
+        self._position_pnl: dict[str, int] = {}
+        self._user_volume: dict[str, int] = defaultdict(int)
+        self._user_pnl: dict[str, int] = defaultdict(int)
+        self._by_volume = TopK()
+        self._by_pnl = TopK()
+        self._stats_cache: Optional[dict] = None
+        self._leaderboard_cache: dict[str, list[dict]] = {}
+
+    def on_change(self, kind: str, old, new):
+        if kind == "market":
+            self._apply_market(old, new)
+        elif kind == "position":
+            self._apply_position(old, new)
+        self._stats_cache = None
+        self._leaderboard_cache.clear()
+
+    def _count_market(self, market: MarketAccount, sign: int):
+        self.total_volume += sign * market.total_pool
+        if market.status == "Active":
+            self.active_markets += sign
+        elif market.status == "Resolved":
+            self.markets_resolved += sign
+
+    def _apply_market(self, old: Optional[MarketAccount], new: Optional[MarketAccount]):
+        if old is not None:
+            self._count_market(old, -1)
+        if new is not None:
+            self._count_market(new, 1)
+            self._markets[new.pubkey] = new
+        else:
+            self._markets.pop(old.pubkey, None)
+        pubkey = (new or old).pubkey
+        for position_key in self._positions_by_market.get(pubkey, ()):
+            self._refresh_pnl(self._positions[position_key])
+
+    def _apply_position(self, old: Optional[PositionAccount], new: Optional[PositionAccount]):
+        if old is not None:
+            self._add_volume(old.user, -(old.yes_amount + old.no_amount))
+            self._positions_by_market[old.market].discard(old.pubkey)
+        if new is not None:
+            self._add_volume(new.user, new.yes_amount + new.no_amount)
+            self._positions_by_market[new.market].add(new.pubkey)
+            self._positions[new.pubkey] = new
+            self._refresh_pnl(new)
+        else:
+            self._positions.pop(old.pubkey, None)
+            self._set_position_pnl(old.user, old.pubkey, 0)
+
+    def _add_volume(self, user: str, delta: int):
+        if not delta:
+            return
+        volume = self._user_volume[user] + delta
+        if volume:
+            self._user_volume[user] = volume
+        else:
+            self._user_volume.pop(user, None)
+        self._by_volume.update(user, volume)
+
+    def _refresh_pnl(self, position: PositionAccount):
+        pnl = realized_pnl(self._markets.get(position.market), position)
+        self._set_position_pnl(position.user, position.pubkey, pnl)
+
+    def _set_position_pnl(self, user: str, position_key: str, pnl: int):
+        delta = pnl - self._position_pnl.get(position_key, 0)
+        if pnl:
+            self._position_pnl[position_key] = pnl
+        else:
+            self._position_pnl.pop(position_key, None)
+        if not delta:
+            return
+        total = self._user_pnl[user] + delta
+        if total:
+            self._user_pnl[user] = total
+        else:
+            self._user_pnl.pop(user, None)
+        self._by_pnl.update(user, total)
+
+    def stats(self) -> dict:
+        if self._stats_cache is None:
+            self._stats_cache = {
+                "active_markets": self.active_markets,
+                "total_volume": format_usdc(self.total_volume),
+                "total_volume_base_units": self.total_volume,
+                "total_traders": len(self._user_volume),
+                "markets_resolved": self.markets_resolved,
+            }
+        return self._stats_cache
+
+    def leaderboard(self, by: str = "volume", limit: int = 10) -> list[dict]:
+        """
+        Top traders by "volume" or realized "pnl" (base units).
+        """
+        if by not in ("volume", "pnl"):
+            raise ValueError(f"Unknown leaderboard metric: {by}")
+        entries = self._leaderboard_cache.get(by)
+        if entries is None:
+            ranking = self._by_volume if by == "volume" else self._by_pnl
+            entries = [
+                {"rank": i, "user": user, by: score}
+                for i, (user, score) in enumerate(ranking.top(self.leaderboard_size), start=1)
+            ]
+            self._leaderboard_cache[by] = entries
+        return entries[:limit]
@@ -0,0 +1,77 @@
+"""
+Bytes on the wire and serialization CPU per 10k rows for each bulk encoding.
+
+    python bench/bench_encodings.py --rows 10000
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+
+from response_encoding import COLUMNAR_JSON, JSON, MSGPACK, brotli, compress, dumps_json, encode_rows, msgpack
+
+FIELDS = ("pubkey", "lamports", "owner")
+
+
+class AccountRow(BaseModel):
+    pubkey: str
+    lamports: int
+    owner: str
+
+
+def _fake_pubkey() -> str:
+    # base58-length string; content doesn't matter for size/CPU
+    return base64.b32encode(os.urandom(27)).decode()[:44]
+
+
+def _timed(fn, repeat: int) -> tuple[bytes, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    owner = _fake_pubkey()
+    rows = [(_fake_pubkey(), random.randint(10 ** 6, 10 ** 9), owner) for _ in range(args.rows)]
+    meta = {"program_id": owner}
+
+    cases = {
+        "pydantic json (baseline)": lambda: dumps_json(
+            {**meta, "accounts": [AccountRow(pubkey=p, lamports=l, owner=o).model_dump() for p, l, o in rows]}
+        ),
+        "json rows (fast path)": lambda: encode_rows(JSON, FIELDS, rows, "accounts", meta),
+        "columnar json": lambda: encode_rows(COLUMNAR_JSON, FIELDS, rows, "accounts", meta),
+    }
+    if msgpack is not None:
+        cases["msgpack"] = lambda: encode_rows(MSGPACK, FIELDS, rows, "accounts", meta)
+
+    scale = 10000 / args.rows
+    print(f"{'encoding':28s} {'raw B':>10s} {'ms/10k':>8s} {'gzip B':>10s} {'ms/10k':>8s} {'br B':>10s} {'ms/10k':>8s}")
+    for name, fn in cases.items():
+        body, seconds = _timed(fn, args.repeat)
+        line = f"{name:28s} {len(body):10d} {seconds * 1000 * scale:8.2f}"
+        for coding in ("gzip", "br"):
+            if coding == "br" and brotli is None:
+                line += f" {'n/a':>10s} {'':>8s}"
+                continue
+            (packed, _), extra = _timed(lambda: compress(body, coding), args.repeat)
+            line += f" {len(packed):10d} {(seconds + extra) * 1000 * scale:8.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Market push fan-out latency vs. subscriber count.
+
+Publishes --updates market changes through a MarketBroadcaster and measures
+the time from publish until each subscriber task has drained the update.
+A --slow-fraction of subscribers sleep between batches to show the
+latest-state-only fallback (their coalesced updates are reported as dropped).
+
+    python bench/bench_fanout.py --subscribers 100 1000 10000 --updates 200 --queue-size 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_push import MarketBroadcaster
+from market_state import MarketAccount, MarketStateStore
+
+MARKETS = [f"Market{i:04d}" for i in range(50)]
+
+
+def _market(pubkey: str) -> MarketAccount:
+    yes = random.randint(0, 10 ** 9)
+    no = random.randint(0, 10 ** 9)
+    return MarketAccount(pubkey, "Creator", f"Question for {pubkey}?", 1_900_000_000, "Active", yes + no, yes, no, False)
+
+
+async def _consume(subscriber, latencies: list, slow: bool, done: asyncio.Event):
+    while not done.is_set():
+        batch = await subscriber.next_batch(0.1)
+        now = time.perf_counter()
+        latencies.extend(now - update.published for update in batch)
+        if slow:
+            await asyncio.sleep(0.05)
+
+
+async def run(subscribers: int, updates: int, interval: float, slow_fraction: float, queue_size: int) -> dict:
+    store = MarketStateStore()
+    broadcaster = MarketBroadcaster(store, queue_size=queue_size, max_subscribers=subscribers)
+    latencies: list[float] = []
+    done = asyncio.Event()
+    subs = [broadcaster.subscribe() for _ in range(subscribers)]
+    tasks = [
+        asyncio.create_task(_consume(sub, latencies, random.random() < slow_fraction, done))
+        for sub in subs
+    ]
+    await asyncio.sleep(0)
+    publish_cost = 0.0
+    for _ in range(updates):
+        new = _market(random.choice(MARKETS))
+        started = time.perf_counter()
+        broadcaster.on_change("market", None, new)
+        publish_cost += time.perf_counter() - started
+        await asyncio.sleep(interval)
+    await asyncio.sleep(0.2)
+    done.set()
+    await asyncio.gather(*tasks)
+    latencies.sort()
+    return {
+        "delivered": len(latencies),
+        "dropped": sum(sub.dropped for sub in subs),
+        "publish_us": publish_cost / updates * 1e6,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--queue-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>11s} {'delivered':>10s} {'dropped':>8s} {'publish us':>11s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for n in args.subscribers:
+        r = asyncio.run(run(n, args.updates, args.interval, args.slow_fraction, args.queue_size))
+        print(
+            f"{n:11d} {r['delivered']:10d} {r['dropped']:8d} {r['publish_us']:11.1f} "
+            f"{r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['max_ms']:8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Per-instruction build cost: anchorpy's program.instruction vs. the
+precompiled InstructionBuilder. Also asserts both produce identical
+instructions (program id, account metas and data bytes).
+
+    python bench/bench_instructions.py --iterations 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anchorpy import Context, Idl, Program, Provider, Wallet
+from solana.rpc.async_api import AsyncClient
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYS_PROGRAM_ID
+
+from idl_codec import DEFAULT_IDL_PATH, InstructionBuilder, load_instructions
+
+TOKEN_PROGRAM_ID = Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
+
+
+def _cases() -> dict:
+    market, user, user_usdc, vault_usdc, position = (Keypair().pubkey() for _ in range(5))
+    transfer = {
+        "market": market,
+        "user": user,
+        "user_usdc": user_usdc,
+        "vault_usdc": vault_usdc,
+        "user_position": position,
+        "token_program": TOKEN_PROGRAM_ID,
+    }
+    return {
+        "initialize_market": (
+            ("Will BizFi ship the indexer before the end of the quarter?", 7 * 24 * 3600),
+            {"market": market, "creator": user, "system_program": SYS_PROGRAM_ID},
+        ),
+        "place_bet": ((25_000_000, True), {**transfer, "system_program": SYS_PROGRAM_ID}),
+        "resolve_market": ((False,), {"market": market, "authority": user}),
+        "claim_winnings": ((), transfer),
+    }
+
+
+def _timed(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    program_id = Keypair().pubkey()
+    with open(DEFAULT_IDL_PATH, "r", encoding="utf-8") as f:
+        idl = Idl.from_json(f.read())
+    program = Program(idl, program_id, Provider(AsyncClient("http://localhost:8899"), Wallet(Keypair())))
+    builder = InstructionBuilder(program_id, load_instructions())
+
+    print(f"{'instruction':20s} {'anchorpy us':>12s} {'builder us':>12s} {'speedup':>8s}")
+    for name, (ix_args, accounts) in _cases().items():
+        method = program.instruction[name]
+        via_anchorpy = lambda: method(*ix_args, ctx=Context(accounts=accounts))
+        via_builder = lambda: builder.build(name, ix_args, accounts)
+        expected, actual = via_anchorpy(), via_builder()
+        assert bytes(expected.data) == bytes(actual.data), f"{name}: data differs"
+        assert expected.accounts == actual.accounts, f"{name}: account metas differ"
+        assert expected == actual, f"{name}: instructions differ"
+        slow = _timed(via_anchorpy, args.iterations)
+        fast = _timed(via_builder, args.iterations)
+        print(f"{name:20s} {slow * 1e6:12.2f} {fast * 1e6:12.2f} {slow / fast:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
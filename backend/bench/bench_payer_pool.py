@@ -0,0 +1,81 @@
+"""
+Server-signed write throughput vs. fee-payer pool size.
+
+The stand-in RPC serializes transactions that share a fee payer (the payer
+account is write-locked by every transaction it pays for) and holds each
+one for --latency seconds, so a single payer caps throughput.
+
+    python bench/bench_payer_pool.py --sizes 1 2 4 8 16 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.transaction import Transaction
+
+from payer_pool import PayerPool
+from solana_client import BizMartOrchestrator
+
+
+class StandInRpc:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._locks: dict[Pubkey, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def get_latest_blockhash(self, commitment=None):
+        return SimpleNamespace(value=SimpleNamespace(blockhash=Hash.default(), last_valid_block_height=1))
+
+    async def send_raw_transaction(self, data: bytes, opts=None):
+        tx = Transaction.from_bytes(data)
+        async with self._locks[tx.message.account_keys[0]]:
+            await asyncio.sleep(self.latency)
+        return SimpleNamespace(value=tx.signatures[0])
+
+
+async def run(size: int, duration: float, concurrency: int, latency: float, max_inflight: int) -> float:
+    orchestrator = BizMartOrchestrator()
+    orchestrator.client = StandInRpc(latency)
+    orchestrator.payer_pool = PayerPool([Keypair() for _ in range(size)], max_inflight=max_inflight)
+    ix = Instruction(Pubkey.new_unique(), b"\x00" * 16, [])
+    sent = 0
+    stop_at = time.monotonic() + duration
+
+    async def client():
+        nonlocal sent
+        while time.monotonic() < stop_at:
+            async with orchestrator.payer_pool.lease() as payer:
+                await orchestrator._send(ix, payer, [])
+            sent += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sent / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--max-inflight", type=int, default=4)
+    args = parser.parse_args()
+
+    base = None
+    for size in args.sizes:
+        tps = asyncio.run(run(size, args.duration, args.concurrency, args.latency, args.max_inflight))
+        base = base or tps
+        print(f"payers={size:3d} {tps:8.1f} tx/s  speedup={tps / base:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Market search latency at 100k markets: index build and update cost, and
+per-query p50/p99 for typical Markets-page queries. Results are checked
+against a brute-force scan.
+
+    python bench/bench_search.py --markets 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_search import MarketSearchIndex, tokenize
+from market_state import MARKET_STATUSES, MarketAccount
+
+WORDS = (
+    "revenue users growth launch mvp saas followers twitter discord token mrr arr "
+    "customers downloads waitlist beta ship release funding seed series partners "
+    "hire engineers github stars retention churn pricing enterprise mobile app web "
+    "api integration marketplace africa europe asia q1 q2 q3 q4 2025 2026 10k 50k 100k"
+).split()
+NOW = 1_750_000_000
+
+
+def _markets(n: int) -> list[MarketAccount]:
+    creators = [f"Creator{i:05d}" for i in range(max(1, n // 50))]
+    markets = []
+    for i in range(n):
+        question = "Will " + " ".join(random.choices(WORDS, k=random.randint(5, 12))) + "?"
+        pool = random.randint(0, 10 ** 10)
+        yes = random.randint(0, pool)
+        markets.append(MarketAccount(
+            f"Market{i:07d}", random.choice(creators), question,
+            NOW + random.randint(-30 * 86400, 90 * 86400),
+            random.choices(MARKET_STATUSES, weights=(80, 18, 2))[0], pool, yes, pool - yes, False,
+        ))
+    return markets
+
+
+def _brute_force(markets, query, creator, status, ends_after, ends_before, sort):
+    tokens = set(tokenize(query))
+    hits = []
+    for m in markets:
+        words = tokenize(m.question)
+        if not all(any(w.startswith(t) for w in words) for t in tokens):
+            continue
+        if creator is not None and m.creator != creator:
+            continue
+        if status is not None and m.status != status:
+            continue
+        if ends_after is not None and m.end_time < ends_after:
+            continue
+        if ends_before is not None and m.end_time > ends_before:
+            continue
+        hits.append(m)
+    field = sort.lstrip("-")
+    hits.sort(key=lambda m: (getattr(m, field), m.pubkey), reverse=sort.startswith("-"))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markets", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    markets = _markets(args.markets)
+    index = MarketSearchIndex()
+    started = time.perf_counter()
+    for m in markets:
+        index.on_change("market", None, m)
+    index.search(sort="total_pool", limit=1)  # merges the buffered sorted-index entries
+    print(f"build: {time.perf_counter() - started:.2f}s for {args.markets} markets, {index.stats()['tokens']} tokens")
+
+    elapsed = 0.0
+    for i in random.sample(range(len(markets)), 1000):
+        m = markets[i]
+        updated = MarketAccount(m.pubkey, m.creator, m.question, m.end_time, m.status,
+                                m.total_pool + 1_000_000, m.yes_pool + 1_000_000, m.no_pool, m.outcome)
+        started = time.perf_counter()
+        index.on_change("market", m, updated)
+        elapsed += time.perf_counter() - started
+        markets[i] = updated
+    print(f"update (bet on a market): {elapsed / 1000 * 1e6:.1f} us")
+
+    creator = markets[0].creator
+    cases = {
+        "no filter, by end_time": dict(),
+        "one word": dict(query="revenue"),
+        "prefix (typing)": dict(query="gro"),
+        "two words": dict(query="launch beta"),
+        "short prefix": dict(query="s"),
+        "creator": dict(creator=creator),
+        "Active, by -total_pool": dict(status="Active", sort="-total_pool"),
+        "ends in 7d, word": dict(query="token", ends_after=NOW, ends_before=NOW + 7 * 86400),
+        "ends in 7d, by pool": dict(ends_after=NOW, ends_before=NOW + 7 * 86400, sort="-total_pool"),
+        "deep page": dict(query="users", offset=2000),
+    }
+    print(f"{'query':28s} {'matches':>8s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for name, params in cases.items():
+        params = {"query": "", "creator": None, "status": None, "ends_after": None,
+                  "ends_before": None, "sort": "end_time", "offset": 0, **params}
+        offset = params.pop("offset")
+        total, page = index.search(**params, offset=offset, limit=20)
+        expected = _brute_force(markets, **params)
+        assert total == len(expected), f"{name}: {total} != {len(expected)}"
+        assert [m.pubkey for m in page] == [m.pubkey for m in expected[offset:offset + 20]], name
+        timings = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            index.search(**params, offset=offset, limit=20)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"{name:28s} {total:8d} {statistics.median(timings) * 1000:8.3f} "
+              f"{timings[int(len(timings) * 0.99) - 1] * 1000:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
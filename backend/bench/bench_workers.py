@@ -0,0 +1,100 @@
+"""
+Throughput of /markets and /chat as uvicorn workers scale from 1 to N.
+
+Runs the API with the SQLite state backend (shared sessions and rate limits)
+and drives it with blocking HTTP clients from a thread pool.
+
+    python bench/bench_workers.py --max-workers 4 --duration 10
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_ready(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def _client(port: int, path: str, stop_at: float, counter: list, lock: threading.Lock, session: str):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    # Two lines: exercises session load/save without calling the LLM
+    body = json.dumps({"message": "a\nb"})
+    headers = {"Content-Type": "application/json", "X-Session-Id": session}
+    done = 0
+    while time.time() < stop_at:
+        if path == "/chat":
+            conn.request("POST", path, body=body, headers=headers)
+        else:
+            conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status == 200:
+            done += 1
+    with lock:
+        counter[0] += done
+
+
+def run(workers: int, path: str, duration: float, concurrency: int, port: int) -> float:
+    env = dict(
+        os.environ,
+        STATE_BACKEND="sqlite",
+        STATE_DB_PATH=os.path.join(tempfile.mkdtemp(), "state.db"),
+        RATE_LIMIT_MAX_REQUESTS="100000000",
+        OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY", "bench"),
+        SOLANA_PROGRAM_ID="",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        _wait_ready(port)
+        counter, lock = [0], threading.Lock()
+        stop_at = time.time() + duration
+        with ThreadPoolExecutor(concurrency) as pool:
+            for i in range(concurrency):
+                pool.submit(_client, port, path, stop_at, counter, lock, f"bench-{i}")
+        return counter[0] / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for path in ("/markets", "/chat"):
+        base = None
+        for workers in range(1, args.max_workers + 1):
+            rps = run(workers, path, args.duration, args.concurrency, args.port)
+            base = base or rps
+            print(f"{path:10s} workers={workers:2d} {rps:10.0f} req/s  speedup={rps / base:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import hashlib
+import os
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+# Upper bound for ?wait= long-polls
+LONG_POLL_MAX_SECONDS = float(os.getenv("LONG_POLL_MAX_SECONDS", "30"))
+
+Renderer = Callable[[], tuple[bytes, dict]]
+
+
+def make_etag(route: str, version, media_type: str, coding: Optional[str]) -> str:
+    """
+    Strong ETag for one representation of `route` at `version`.
+    """
+    tag = hashlib.blake2b(f"{route}|{version}|{media_type}|{coding}".encode(), digest_size=8).hexdigest()
+    return f'"{tag}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return etag in candidates
+
+
+def long_poll_seconds(request: Request) -> float:
+    try:
+        wait = float(request.query_params.get("wait", 0))
+    except ValueError:
+        return 0.0
+    return max(0.0, min(wait, LONG_POLL_MAX_SECONDS))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept, Accept-Encoding"})
+
+
+class ResponseCache:
+    """
+    Latest serialized body per (route, media type, coding). A body is reused
+    until the route's version changes, so repeated polls skip serialization.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple, tuple[object, bytes, dict]] = {}
+
+    def get_or_render(self, route: str, version, media_type: str, coding: Optional[str], render: Renderer):
+        key = (route, media_type, coding)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            body, headers = render()
+            entry = (version, body, headers)
+            self._entries[key] = entry
+        return entry[1], entry[2]
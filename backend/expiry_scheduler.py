@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from market_state import MarketStateStore
+from prevalidation import PREVALIDATION_CLOCK_SKEW_SECONDS
+from state_backend import StateBackend
+
+# Expiries are rounded up to this window so neighbours resolve in one batch
+EXPIRY_BATCH_WINDOW_SECONDS = float(os.getenv("EXPIRY_BATCH_WINDOW_SECONDS", "5"))
+EXPIRY_MAX_BATCH = int(os.getenv("EXPIRY_MAX_BATCH", "32"))
+# Re-check a submitted market this long later if it is still Active; the
+# delay doubles with every finished attempt that left it Active, up to the max
+EXPIRY_RETRY_SECONDS = float(os.getenv("EXPIRY_RETRY_SECONDS", "60"))
+EXPIRY_MAX_RETRY_SECONDS = float(os.getenv("EXPIRY_MAX_RETRY_SECONDS", "3600"))
+EXPIRY_HEARTBEAT_SECONDS = 10
+
+_OUTCOME_KEY = "expiry:outcome:"
+# Set with a TTL while a scheduler runs in some process
+_RUNNING_KEY = "expiry:scheduler"
+
+# (kind, payload) -> job dict; raises when the queue cannot take the job
+SubmitJob = Callable[[str, dict], Awaitable[dict]]
+# job_id -> job dict, or None once it is gone
+JobStatus = Callable[[str], Awaitable[Optional[dict]]]
+
+
+class ExpiryScheduler:
+    """
+    Resolves Active markets once their end_time passes.
+
+    Markets sit in a min-heap keyed by when they are due (end_time plus the
+    chain clock skew margin, rounded up to the batch window), maintained
+    from store changes with lazy deletion. The loop sleeps until the heap's
+    head is due, then submits every due market with a pre-registered outcome
+    as one "market/resolve_batch" job. Markets without an outcome wait in
+    `awaiting_outcome` and are re-checked every `retry` seconds, so an
+    outcome registered through another worker is picked up. A market whose
+    job is still queued or running is not resubmitted, and one that stays
+    Active after its job finished (e.g. Unauthorized) backs off exponentially.
+    """
+
+    def __init__(
+        self,
+        store: MarketStateStore,
+        outcomes: StateBackend,
+        submit: SubmitJob,
+        job_status: JobStatus,
+        batch_window: float = EXPIRY_BATCH_WINDOW_SECONDS,
+        max_batch: int = EXPIRY_MAX_BATCH,
+        retry: float = EXPIRY_RETRY_SECONDS,
+        max_retry: float = EXPIRY_MAX_RETRY_SECONDS,
+    ):
+        self.store = store
+        self.outcomes = outcomes
+        self.submit = submit
+        self.job_status = job_status
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retry = retry
+        self.max_retry = max_retry
+        self._heap: list[tuple[float, str]] = []
+        self._due: dict[str, float] = {}
+        self.awaiting_outcome: dict[str, int] = {}
+        self._submitted: dict[str, str] = {}
+        # Finished jobs that left the market Active
+        self._attempts: dict[str, int] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._counts = {"batches": 0, "submitted": 0, "submit_failures": 0}
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        for market in store.markets.values():
+            self.on_change("market", None, market)
+        store.add_listener(self.on_change)
+
+    def _due_at(self, end_time: int) -> float:
+        ready = end_time + PREVALIDATION_CLOCK_SKEW_SECONDS
+        if self.batch_window <= 0:
+            return ready
+        return math.ceil(ready / self.batch_window) * self.batch_window
+
+    def _schedule(self, pubkey: str, due_at: float):
+        head = self._next_due()
+        self._due[pubkey] = due_at
+        heapq.heappush(self._heap, (due_at, pubkey))
+        if head is None or due_at < head:
+            self._wake.set()
+
+    def _next_due(self) -> Optional[float]:
+        # Drop entries superseded by a reschedule or removal
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def on_change(self, kind: str, old, new):
+        if kind != "market":
+            return
+        if new is None or new.status != "Active":
+            pubkey = (new or old).pubkey
+            self._due.pop(pubkey, None)
+            self.awaiting_outcome.pop(pubkey, None)
+            self._submitted.pop(pubkey, None)
+            self._attempts.pop(pubkey, None)
+            return
+        if old is not None and old.status == "Active" and old.end_time == new.end_time:
+            return
+        if new.pubkey not in self.awaiting_outcome:
+            self._schedule(new.pubkey, self._due_at(new.end_time))
+
+    async def register_outcome(self, market_pubkey: str, outcome: bool):
+        """
+        Outcome to resolve the market with once it expires; an already
+        expired market is resolved right away.
+        """
+        await self.outcomes.set(_OUTCOME_KEY + market_pubkey, b"1" if outcome else b"0")
+        backed_off = self._attempts.pop(market_pubkey, None) is not None
+        if self.awaiting_outcome.pop(market_pubkey, None) is not None or backed_off:
+            self._schedule(market_pubkey, time.time())
+
+    async def running(self) -> bool:
+        """
+        Whether a scheduler is running in any process sharing the backend.
+        """
+        return await self.outcomes.get(_RUNNING_KEY) is not None
+
+    def _retry_delay(self, pubkey: str) -> float:
+        return min(self.max_retry, self.retry * 2 ** self._attempts.get(pubkey, 0))
+
+    async def _outcome(self, market_pubkey: str) -> Optional[bool]:
+        value = await self.outcomes.get(_OUTCOME_KEY + market_pubkey)
+        return None if value is None else value == b"1"
+
+    def _pop_due(self, now: float) -> list[str]:
+        due = []
+        while len(due) < self.max_batch:
+            head = self._next_due()
+            if head is None or head > now:
+                break
+            _, pubkey = heapq.heappop(self._heap)
+            del self._due[pubkey]
+            due.append(pubkey)
+        return due
+
+    async def _process(self, pubkeys: list[str], now: float):
+        batch = []
+        for pubkey in pubkeys:
+            market = self.store.markets.get(pubkey)
+            if market is None or market.status != "Active":
+                self._submitted.pop(pubkey, None)
+                self._attempts.pop(pubkey, None)
+                continue
+            job_id = self._submitted.get(pubkey)
+            if job_id is not None:
+                job = await self.job_status(job_id)
+                if job is not None and job["status"] in ("queued", "running"):
+                    self._schedule(pubkey, now + self.retry)
+                    continue
+                del self._submitted[pubkey]
+                self._attempts[pubkey] = self._attempts.get(pubkey, 0) + 1
+                if job is not None and job["status"] != "succeeded":
+                    print(f"Warning: resolving expired market {pubkey} failed: {job['error']}")
+            outcome = await self._outcome(pubkey)
+            if outcome is None:
+                self.awaiting_outcome[pubkey] = market.end_time
+                self._schedule(pubkey, now + self.retry)
+                continue
+            self.awaiting_outcome.pop(pubkey, None)
+            self._last_lag = now - market.end_time
+            self._max_lag = max(self._max_lag, self._last_lag)
+            batch.append({"market_pubkey": pubkey, "outcome": outcome})
+        if not batch:
+            return
+        try:
+            job = await self.submit("market/resolve_batch", {"markets": batch})
+            self._counts["batches"] += 1
+            self._counts["submitted"] += len(batch)
+            for item in batch:
+                self._submitted[item["market_pubkey"]] = job["job_id"]
+        except Exception as e:
+            print(f"Warning: could not submit {len(batch)} expired markets: {e}")
+            self._counts["submit_failures"] += 1
+        # Still Active after the retry delay (and its job done) means the resolve did not land
+        for item in batch:
+            self._schedule(item["market_pubkey"], now + self._retry_delay(item["market_pubkey"]))
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            head = self._next_due()
+            now = time.time()
+            if head is None or head > now:
+                timeout = None if head is None else head - now
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(self._pop_due(now), now)
+            except Exception as e:
+                print(f"Warning: expiry scheduler batch failed: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self.outcomes.set(_RUNNING_KEY, b"1", ttl=3 * EXPIRY_HEARTBEAT_SECONDS)
+            except Exception as e:
+                print(f"Warning: expiry scheduler heartbeat failed: {e}")
+            await asyncio.sleep(EXPIRY_HEARTBEAT_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        for task in (self._task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._heartbeat_task = None
+
+    def stats(self) -> dict:
+        head = self._next_due()
+        now = time.time()
+        return {
+            "pending": len(self._due),
+            "awaiting_outcome": len(self.awaiting_outcome),
+            "backing_off": len(self._attempts),
+            "next_due_in_seconds": None if head is None else round(head - now, 3),
+            # How far the loop is behind the oldest due market
+            "lag_seconds": round(now - head, 3) if head is not None and head < now else 0.0,
+            "last_lag_seconds": round(self._last_lag, 3),
+            "max_lag_seconds": round(self._max_lag, 3),
+            **self._counts,
+        }
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from state_backend import StateBackend
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# A claimed key expires after this long if its worker dies mid-call
+IDEMPOTENCY_PENDING_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_PENDING_TTL_SECONDS", "300"))
+# Duplicates wait this long for a call running in another worker
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_POLL_SECONDS = 0.25
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+
+
+class IdempotencyInProgress(Exception):
+    """Raised when the first request with a key is still running elsewhere."""
+
+
+class OutcomeUnknown(Exception):
+    """
+    Raised by a call whose side effect may already have happened, e.g. a
+    transaction that was sent but not confirmed. Its key stays claimed and
+    retries raise it again instead of repeating the call.
+    """
+
+    def __init__(self, message: str, signature: Optional[str] = None):
+        super().__init__(message)
+        self.signature = signature
+
+
+class IdempotencyCache:
+    """
+    Runs each (scope, key) at most once across all workers.
+
+    The first caller claims the key in the state backend with a pending
+    marker (set-if-absent) and runs the call in a detached task, so a
+    client disconnect does not abort a write that may already be on chain.
+    Duplicates in the same process join that task; duplicates on other
+    workers poll the marker until the result is stored. Successful results
+    are kept for `ttl` seconds. Error results and exceptions release the key
+    so a corrected retry can run, except OutcomeUnknown, which is stored so
+    that retries report it rather than send a second transaction.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._in_flight: dict[str, tuple[str, asyncio.Task]] = {}
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        body: str,
+        func: Callable[[], Awaitable[dict]],
+    ) -> tuple[dict, bool]:
+        """
+        Returns (result, replayed). `body` identifies the request payload.
+        """
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValueError(f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+        cache_key = f"idem:{scope}:{key}"
+        fingerprint = hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+        joined = self._in_flight.get(cache_key)
+        if joined is not None:
+            joined_fingerprint, task = joined
+            if joined_fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key reused with a different request")
+            result, _ = await asyncio.shield(task)
+            return result, True
+
+        task = asyncio.create_task(self._run_once(cache_key, fingerprint, func))
+        self._in_flight[cache_key] = (fingerprint, task)
+        task.add_done_callback(lambda t: self._done(cache_key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, cache_key: str, task: asyncio.Task):
+        self._in_flight.pop(cache_key, None)
+        # Callers may all have gone; don't warn about an unretrieved exception
+        if not task.cancelled():
+            task.exception()
+
+    async def _run_once(self, cache_key: str, fingerprint: str, func) -> tuple[dict, bool]:
+        pending = json.dumps({"f": fingerprint}, separators=(",", ":")).encode("utf-8")
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while not await self.backend.add(cache_key, pending, ttl=IDEMPOTENCY_PENDING_TTL_SECONDS):
+            stored = await self.backend.get(cache_key)
+            if stored is None:
+                # Released or expired between the two calls; try to claim again
+                continue
+            entry = json.loads(stored)
+            if entry["f"] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key reused with a different request")
+            if "r" in entry:
+                return entry["r"], True
+            if "u" in entry:
+                raise OutcomeUnknown(entry["u"]["error"], entry["u"]["signature"])
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress("A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+        try:
+            result = await func()
+        except OutcomeUnknown as e:
+            unknown = {"error": str(e), "signature": e.signature}
+            entry = json.dumps({"f": fingerprint, "u": unknown}, separators=(",", ":"))
+            await self.backend.set(cache_key, entry.encode("utf-8"), ttl=self.ttl)
+            raise
+        except BaseException:
+            await self.backend.delete(cache_key)
+            raise
+        if isinstance(result, dict) and result.get("error"):
+            # Rejections (stale cache, unsupported signer) may pass on retry
+            await self.backend.delete(cache_key)
+            return result, False
+        entry = json.dumps({"f": fingerprint, "r": result}, separators=(",", ":"))
+        await self.backend.set(cache_key, entry.encode("utf-8"), ttl=self.ttl)
+        return result, False
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import struct
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from solders.instruction import AccountMeta, Instruction
+from solders.pubkey import Pubkey
+
+DEFAULT_IDL_PATH = os.path.join(os.path.dirname(__file__), "idl", "bizfi_market.json")
+
+# Fixed-size Borsh primitives: struct format per IDL type name
+_PRIMITIVES = {
+    "bool": "<?",
+    "u8": "<B",
+    "i8": "<b",
+    "u16": "<H",
+    "i16": "<h",
+    "u32": "<I",
+    "i32": "<i",
+    "u64": "<Q",
+    "i64": "<q",
+}
+
+
+def snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def instruction_discriminator(name: str) -> bytes:
+    """
+    Anchor instruction discriminator: sha256("global:<snake_name>")[:8].
+    """
+    return hashlib.sha256(f"global:{snake_case(name)}".encode()).digest()[:8]
+
+
+@dataclass(frozen=True)
+class IdlInstruction:
+    name: str
+    snake_name: str
+    discriminator: bytes
+    # (snake_name, idl type)
+    args: tuple[tuple[str, object], ...]
+    # (snake_name, is_mut, is_signer)
+    accounts: tuple[tuple[str, bool, bool], ...]
+
+
+def load_instructions(path: str = DEFAULT_IDL_PATH) -> dict[str, IdlInstruction]:
+    """
+    Instructions of an Anchor IDL keyed by snake_case name.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        idl = json.load(f)
+    instructions = {}
+    for ix in idl["instructions"]:
+        parsed = IdlInstruction(
+            name=ix["name"],
+            snake_name=snake_case(ix["name"]),
+            discriminator=instruction_discriminator(ix["name"]),
+            args=tuple((snake_case(a["name"]), a["type"]) for a in ix["args"]),
+            accounts=tuple((snake_case(a["name"]), a["isMut"], a["isSigner"]) for a in ix["accounts"]),
+        )
+        instructions[parsed.snake_name] = parsed
+    return instructions
+
+
+def _read(idl_type, data: bytes, offset: int) -> tuple[object, int]:
+    if idl_type in _PRIMITIVES:
+        fmt = _PRIMITIVES[idl_type]
+        (value,) = struct.unpack_from(fmt, data, offset)
+        return value, offset + struct.calcsize(fmt)
+    if idl_type in ("u128", "i128"):
+        value = int.from_bytes(data[offset:offset + 16], "little", signed=idl_type == "i128")
+        return value, offset + 16
+    if idl_type == "string":
+        (length,) = struct.unpack_from("<I", data, offset)
+        start = offset + 4
+        return data[start:start + length].decode("utf-8"), start + length
+    if idl_type == "publicKey":
+        return str(Pubkey.from_bytes(data[offset:offset + 32])), offset + 32
+    raise ValueError(f"Unsupported IDL type: {idl_type}")
+
+
+def _writer(idl_type) -> Callable[[object], bytes]:
+    if idl_type in _PRIMITIVES:
+        return struct.Struct(_PRIMITIVES[idl_type]).pack
+    if idl_type in ("u128", "i128"):
+        return lambda value: int(value).to_bytes(16, "little", signed=idl_type == "i128")
+    if idl_type == "string":
+        def write_string(value) -> bytes:
+            raw = value.encode("utf-8")
+            return struct.pack("<I", len(raw)) + raw
+        return write_string
+    if idl_type == "publicKey":
+        return bytes
+    raise ValueError(f"Unsupported IDL type: {idl_type}")
+
+
+def compile_encoder(ix: IdlInstruction) -> Callable[[tuple], bytes]:
+    """
+    Data encoder for one instruction: discriminator followed by the Borsh
+    arguments. Instructions with only fixed-size primitive arguments pack
+    with a single precompiled struct.
+    """
+    discriminator = ix.discriminator
+    types = [idl_type for _, idl_type in ix.args]
+    if all(idl_type in _PRIMITIVES for idl_type in types):
+        packer = struct.Struct("<" + "".join(_PRIMITIVES[t][1:] for t in types))
+        if not types:
+            return lambda args: discriminator
+        return lambda args: discriminator + packer.pack(*args)
+    writers = [_writer(t) for t in types]
+    return lambda args: discriminator + b"".join(w(a) for w, a in zip(writers, args))
+
+
+class InstructionDecoder:
+    """
+    Decodes program instruction data by its 8-byte discriminator.
+    """
+
+    def __init__(self, instructions: dict[str, IdlInstruction]):
+        self.by_discriminator = {ix.discriminator: ix for ix in instructions.values()}
+
+    def decode(self, data: bytes) -> Optional[tuple[IdlInstruction, dict]]:
+        ix = self.by_discriminator.get(bytes(data[:8]))
+        if ix is None:
+            return None
+        offset = 8
+        args = {}
+        for name, idl_type in ix.args:
+            args[name], offset = _read(idl_type, data, offset)
+        return ix, args
+
+
+class InstructionBuilder:
+    """
+    Builds program instructions without anchorpy's per-call dispatch.
+
+    Discriminators, argument encoders and account meta flags are compiled
+    from the IDL once; build() only packs the arguments and orders the
+    accounts. The output matches anchorpy's program.instruction byte for byte
+    (bench/bench_instructions.py checks this).
+    """
+
+    def __init__(self, program_id, instructions: dict[str, IdlInstruction]):
+        self.program_id = program_id
+        self._compiled = {
+            name: (ix.args, compile_encoder(ix), ix.accounts)
+            for name, ix in instructions.items()
+        }
+
+    def build(self, name: str, args: tuple, accounts: dict) -> Instruction:
+        """
+        Instruction `name` (snake_case) with positional `args` and `accounts`
+        keyed by snake_case IDL account name.
+        """
+        arg_specs, encode, account_specs = self._compiled[name]
+        if len(args) != len(arg_specs):
+            raise ValueError(f"{name} takes {len(arg_specs)} arguments, got {len(args)}")
+        try:
+            metas = [
+                AccountMeta(accounts[account], is_signer, is_mut)
+                for account, is_mut, is_signer in account_specs
+            ]
+        except KeyError as e:
+            raise ValueError(f"{name} is missing account {e.args[0]}")
+        return Instruction(self.program_id, encode(args), metas)
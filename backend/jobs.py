@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(__file__), "jobs.db"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+# Queued + running jobs above this are rejected (backpressure)
+JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", "500"))
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOBS_SUBSCRIBER_QUEUE_SIZE = 256
+# Each process heartbeats its owner row; running jobs of an owner silent for
+# JOBS_OWNER_TIMEOUT_SECONDS are marked interrupted by whichever process notices
+JOBS_HEARTBEAT_SECONDS = 10
+JOBS_OWNER_TIMEOUT_SECONDS = 3 * JOBS_HEARTBEAT_SECONDS
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at JOBS_MAX_PENDING."""
+
+
+class JobQueue:
+    """
+    Persisted queue of on-chain writes executed by a bounded worker pool.
+
+    Jobs are stored in SQLite so queued work survives a restart. Jobs that
+    were running when their process stopped are marked "interrupted" rather
+    than retried, since their transaction may already have been sent. Several
+    processes can share a database: workers claim jobs atomically and record
+    the claiming process as the owner, and only jobs whose owner stopped
+    heartbeating are interrupted.
+    """
+
+    def __init__(
+        self,
+        handlers: dict[str, JobHandler],
+        path: str = JOBS_DB_PATH,
+        workers: int = JOBS_WORKERS,
+        max_pending: int = JOBS_MAX_PENDING,
+    ):
+        self.handlers = handlers
+        self.workers = workers
+        self.max_pending = max_pending
+        self.owner = uuid.uuid4().hex
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT, payload TEXT, status TEXT, "
+            "result TEXT, error TEXT, created REAL, updated REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS owners (id TEXT PRIMARY KEY, heartbeat REAL)")
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending = 0
+        self._tasks: list[asyncio.Task] = []
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _run(self, sql: str, params: tuple = ()) -> list:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    @staticmethod
+    def _row_to_job(row) -> dict:
+        job_id, kind, status, result, error, created, updated = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created": created,
+            "updated": updated,
+        }
+
+    async def _heartbeat(self):
+        await self._run(
+            "INSERT INTO owners (id, heartbeat) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+            (self.owner, time.time()),
+        )
+
+    async def _interrupt_orphans(self):
+        """
+        Mark running jobs of stopped or unresponsive processes as interrupted.
+        """
+        now = time.time()
+        await self._run("DELETE FROM owners WHERE heartbeat < ?", (now - JOBS_OWNER_TIMEOUT_SECONDS,))
+        await self._run(
+            "UPDATE jobs SET status = 'interrupted', updated = ? WHERE status = 'running' "
+            "AND (owner IS NULL OR owner NOT IN (SELECT id FROM owners))",
+            (now,),
+        )
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(JOBS_HEARTBEAT_SECONDS)
+            try:
+                await self._heartbeat()
+                await self._interrupt_orphans()
+            except Exception as e:
+                print(f"Warning: job owner heartbeat failed: {e}")
+
+    async def start(self):
+        now = time.time()
+        await self._heartbeat()
+        await self._interrupt_orphans()
+        await self._run(
+            "DELETE FROM jobs WHERE status NOT IN ('queued') AND updated < ?",
+            (now - JOBS_RETENTION_SECONDS,),
+        )
+        for (job_id,) in await self._run("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created"):
+            self._pending += 1
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Our cancelled jobs become orphans for the other processes to interrupt
+        await self._run("DELETE FROM owners WHERE id = ?", (self.owner,))
+        self._conn.close()
+
+    async def submit(self, kind: str, payload: dict) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._pending >= self.max_pending:
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+        self._pending += 1
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            await self._run(
+                "INSERT INTO jobs (id, kind, payload, status, created, updated) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+        except Exception:
+            self._pending -= 1
+            raise
+        self._queue.put_nowait(job_id)
+        job = {"job_id": job_id, "kind": kind, "status": "queued", "result": None,
+               "error": None, "created": now, "updated": now}
+        self._publish(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        rows = await self._run(
+            "SELECT id, kind, status, result, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+        )
+        return self._row_to_job(rows[0]) if rows else None
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "queued": self._queue.qsize(),
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "subscribers": len(self._subscribers),
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=JOBS_SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._subscribers.discard(q)
+
+    def _publish(self, job: dict):
+        for q in self._subscribers:
+            if q.full():
+                # slow consumer: drop the oldest update, it can poll /jobs/{id}
+                q.get_nowait()
+            q.put_nowait(job)
+
+    async def _set_status(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        await self._run(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+        )
+        job = await self.get(job_id)
+        if job:
+            self._publish(job)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                # Claim atomically: another worker process may share the database
+                rows = await self._run(
+                    "UPDATE jobs SET status = 'running', owner = ?, updated = ? WHERE id = ? AND status = 'queued' "
+                    "RETURNING id, kind, status, result, error, created, updated, payload",
+                    (self.owner, time.time(), job_id),
+                )
+                if not rows:
+                    continue
+                self._publish(self._row_to_job(rows[0][:7]))
+                kind, payload = rows[0][1], rows[0][7]
+                try:
+                    result = await self.handlers[kind](json.loads(payload))
+                except Exception as e:
+                    await self._set_status(job_id, "failed", error=str(e))
+                    continue
+                failed = result.get("failed") if isinstance(result, dict) else None
+                if isinstance(result, dict) and result.get("error"):
+                    await self._set_status(job_id, "failed", result=result, error=str(result["error"]))
+                elif failed:
+                    # Batch results ({"resolved": n, "failed": [...]}): "partial" if some succeeded
+                    status = "partial" if result.get("resolved") else "failed"
+                    await self._set_status(job_id, status, result=result, error=f"{len(failed)} items failed")
+                else:
+                    await self._set_status(job_id, "succeeded", result=result)
+            except Exception as e:
+                print(f"Warning: job {job_id} bookkeeping failed: {e}")
+            finally:
+                self._pending -= 1
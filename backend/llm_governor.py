@@ -0,0 +1,207 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+from tracing import span
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Budget for one call including time spent waiting for a slot
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "4"))
+# Calls slower than this count against the breaker even when they succeed
+LLM_SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", "2.5"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Trips open when the share of failed or slow calls over the last `window`
+    calls reaches `failure_rate`. After `cooldown` seconds a single probe call
+    is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        window: int = LLM_BREAKER_WINDOW,
+        min_calls: int = LLM_BREAKER_MIN_CALLS,
+        failure_rate: float = LLM_BREAKER_FAILURE_RATE,
+        cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS,
+    ):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            if ok:
+                self.state = "closed"
+            else:
+                self._trip()
+            return
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._trip()
+
+    def abandon(self):
+        """
+        The allowed call ended without an outcome (cancelled); a half-open
+        breaker lets the next call probe instead.
+        """
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def _trip(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+
+    def failure_ratio(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+
+class LLMGovernor:
+    """
+    Shared LLM client with a process-wide concurrency cap, a per-call deadline
+    and a circuit breaker. Any call that cannot complete in time returns the
+    caller's deterministic fallback text.
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        slow_call: float = LLM_SLOW_CALL_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.slow_call = slow_call
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+        self._counts = {"calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "short_circuited": 0}
+
+    async def _call(self, messages) -> str:
+        self._waiting += 1
+        try:
+            with span("llm.queue_wait", queue_depth=self._waiting):
+                await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            with span("llm.invoke"):
+                response = await self.llm.ainvoke(messages)
+            return response.content.strip()
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def complete(self, messages, fallback: str) -> str:
+        if not self.breaker.allow():
+            self._counts["short_circuited"] += 1
+            return fallback
+        self._counts["calls"] += 1
+        started = time.monotonic()
+        try:
+            with span("llm.call", deadline=self.deadline):
+                text = await asyncio.wait_for(self._call(messages), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self._counts["timeouts"] += 1
+            self.breaker.record(False)
+            return fallback
+        except Exception as e:
+            print(f"Warning: LLM call failed: {e}")
+            self._counts["errors"] += 1
+            self.breaker.record(False)
+            return fallback
+        except BaseException:
+            # Cancelled (client gone, shutdown): says nothing about the LLM
+            self.breaker.abandon()
+            raise
+        self._counts["ok"] += 1
+        self.breaker.record(time.monotonic() - started < self.slow_call)
+        return text or fallback
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._waiting,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "breaker_state": self.breaker.state,
+            "breaker_failure_ratio": round(self.breaker.failure_ratio(), 3),
+            **self._counts,
+        }
+
+
+_governor: Optional[LLMGovernor] = None
+
+
+def current_governor() -> Optional[LLMGovernor]:
+    """
+    The governor if one was built, without building it (for metrics).
+    """
+    return _governor
+
+
+def get_governor() -> LLMGovernor:
+    """
+    Process-wide governor around one pooled OpenRouter client.
+    """
+    global _governor
+    if _governor is None:
+        openrouter_key = os.getenv("OPENROUTER_API_KEY")
+        if not openrouter_key:
+            raise ValueError("OPENROUTER_API_KEY is not set in .env")
+        llm = ChatOpenAI(
+            model=os.getenv("OPENROUTER_MODEL", "openai/gpt-oss-120b:free"),
+            api_key=openrouter_key,
+            base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+            default_headers={
+                "HTTP-Referer": os.getenv("OPENROUTER_SITE_URL", "http://localhost:8000"),
+                "X-Title": os.getenv("OPENROUTER_APP_NAME", "BizFi"),
+            },
+            timeout=LLM_DEADLINE_SECONDS,
+            # Retries would blow the deadline; the fallback question covers failures
+            max_retries=0,
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                ),
+                timeout=LLM_DEADLINE_SECONDS,
+            ),
+        )
+        _governor = LLMGovernor(llm)
+    return _governor
@@ -1,14 +1,119 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from solders.pubkey import Pubkey
 from typing import List, Optional
+from admission import AdmissionController, Overloaded, classify, default_classes
 from agent import BizMartAgent
+from aggregates import AggregatesEngine, format_usdc
+from idempotency import IdempotencyCache, IdempotencyConflict, IdempotencyInProgress, OutcomeUnknown
+from jobs import JobQueue, QueueFull
+from llm_governor import current_governor
+from market_push import MarketBroadcaster, TooManySubscribers
+from market_search import MarketSearchIndex
+from market_state import MarketStateSync, store as market_state
+from payer_pool import get_payer_pool
+from expiry_scheduler import ExpiryScheduler
+from conditional import ResponseCache, etag_matches, long_poll_seconds, make_etag, not_modified
+from response_encoding import encode_rows, encode_value, finish, negotiate, rows_response
+from solana_client import PROGRAM_ACCOUNT_FIELDS, BizMartOrchestrator
+from state_backend import create_state_backend
+from state_snapshot import SnapshotWriter, load_snapshot
+from trade_indexer import TRADE_FIELDS, TradeIndexer, TradeStore
+from collections import OrderedDict
+import asyncio
+import hashlib
+import secrets
+import json
+import os
 import time
-from collections import defaultdict, deque
+import marshal
+import prevalidation
+import tracing
 
 app = FastAPI(title="BizFi API", version="1.0.0")
 
-# Enable CORS for frontend
+# Sessions and rate limits live in a pluggable backend so that
+# `uvicorn --workers N` shares them (see STATE_BACKEND in state_backend.py)
+_state = create_state_backend()
+
+# Retried writes with the same Idempotency-Key replay the first result
+_idempotency = IdempotencyCache(_state)
+
+# Priority-aware admission control; defined before rate_limit so it runs inside it
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+_admission = AdmissionController(default_classes())
+
+@app.middleware("http")
+async def admit(request: Request, call_next):
+    """
+    Queue each request in its priority class (see admission.py); shed with
+    503 + Retry-After when the queue wait would exceed the class budget.
+    """
+    if not ADMISSION_ENABLED:
+        return await call_next(request)
+    long_poll = long_poll_seconds(request) > 0 and "if-none-match" in request.headers
+    name = classify(request.method, request.url.path, long_poll)
+    if name is None:
+        return await call_next(request)
+    cls = _admission.classes[name]
+    try:
+        await cls.acquire()
+    except Overloaded as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server busy. Please retry shortly."},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        cls.release(time.perf_counter() - started)
+
+@app.on_event("startup")
+async def start_admission():
+    if ADMISSION_ENABLED:
+        _admission.start()
+
+@app.on_event("shutdown")
+async def stop_admission():
+    await _admission.stop()
+
+# Rate limiter (per IP)
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "60"))
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    client_ip = request.client.host if request.client else "unknown"
+    if not await _state.hit(f"rl:{client_ip}", RATE_LIMIT_WINDOW_SECONDS, RATE_LIMIT_MAX_REQUESTS):
+        return JSONResponse(status_code=429, content={"detail": "Too many requests. Please slow down."})
+    return await call_next(request)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Opt-in tracing: a TRACE_SAMPLE_RATE share of requests, or any request with
+    X-Debug-Trace: <TRACE_ADMIN_TOKEN>. X-Debug-Profile adds a cProfile run.
+    Results are listed under /debug/traces.
+    """
+    forced = tracing.authorized(request.headers.get("x-debug-trace"))
+    profile = tracing.authorized(request.headers.get("x-debug-profile"))
+    if not (forced or profile or tracing.should_sample()):
+        return await call_next(request)
+    trace, token, profiler = tracing.start_trace(f"{request.method} {request.url.path}", profile)
+    try:
+        with tracing.span("http.request", method=request.method, path=request.url.path):
+            response = await call_next(request)
+    finally:
+        tracing.finish_trace(trace, token, profiler)
+    response.headers["X-Trace-Id"] = trace.id
+    return response
+
+# Enable CORS for frontend. Added last so it is the outermost layer and also
+# covers the 429/503 responses of the middlewares above.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify exact origins
@@ -17,24 +122,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Simple in-memory rate limiter (per IP)
-RATE_LIMIT_WINDOW_SECONDS = 60
-RATE_LIMIT_MAX_REQUESTS = 60
-_ip_requests: dict[str, deque[float]] = defaultdict(deque)
-
-@app.middleware("http")
-async def rate_limit(request: Request, call_next):
-    client_ip = request.client.host if request.client else "unknown"
-    now = time.time()
-    q = _ip_requests[client_ip]
-    # drop old entries
-    while q and now - q[0] > RATE_LIMIT_WINDOW_SECONDS:
-        q.popleft()
-    if len(q) >= RATE_LIMIT_MAX_REQUESTS:
-        raise HTTPException(status_code=429, detail="Too many requests. Please slow down.")
-    q.append(now)
-    return await call_next(request)
-
 class ChatRequest(BaseModel):
     message: str
 
@@ -43,6 +130,7 @@ class ChatResponse(BaseModel):
 
 class Market(BaseModel):
     id: int
+    pubkey: Optional[str] = None
     title: str
     question: str
     pool: str
@@ -79,18 +167,83 @@ class ClaimWinningsRequest(BaseModel):
     vault_usdc: str
     user_position: str
 
-_agents: dict[str, BizMartAgent] = {}
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+
+# Per-process cache of agent objects; the session state itself is loaded from
+# and saved to the state backend on every request.
+_agents: OrderedDict[str, BizMartAgent] = OrderedDict()
+# Evicted agents get this long to finish in-flight requests before their RPC client is closed
+AGENT_CLOSE_GRACE_SECONDS = 30
+_closing_agents: set[asyncio.Task] = set()
+
+# Decoded program state and the views derived from it
+aggregates = AggregatesEngine()
+market_state.add_listener(aggregates.on_change)
+_state_sync: Optional[MarketStateSync] = None
+_snapshot_writer: Optional[SnapshotWriter] = None
+
+@app.on_event("startup")
+async def start_state_sync():
+    global _state_sync, _snapshot_writer
+    orchestrator = BizMartOrchestrator()
+    if not orchestrator.program_id:
+        print("Warning: SOLANA_PROGRAM_ID not set, market state sync disabled")
+        return
+    # Serve from the last snapshot right away; the sync catches up from its signature
+    program_id = str(orchestrator.program_id)
+    warm = load_snapshot(market_state, program_id)
+    _state_sync = MarketStateSync(orchestrator, market_state)
+    _state_sync.start(warm=warm)
+    _snapshot_writer = SnapshotWriter(market_state, program_id)
+    _snapshot_writer.start()
+
+@app.on_event("shutdown")
+async def stop_state_sync():
+    if _state_sync is not None:
+        await _state_sync.stop()
+        await _state_sync.orchestrator.close()
+    if _snapshot_writer is not None:
+        await _snapshot_writer.stop()
+    await _state.close()
 
 def _get_session_id(request: Request) -> str:
     return request.headers.get("x-session-id") or request.headers.get("X-Session-Id") or "default"
 
+async def _close_agent(agent: BizMartAgent):
+    await asyncio.sleep(AGENT_CLOSE_GRACE_SECONDS)
+    try:
+        await agent.orchestrator.close()
+    except Exception as e:
+        print(f"Warning: could not close evicted agent's RPC client: {e}")
+
 def _get_agent(session_id: str) -> BizMartAgent:
     agent = _agents.get(session_id)
     if agent is None:
         agent = BizMartAgent()
         _agents[session_id] = agent
+        if len(_agents) > SESSION_CACHE_SIZE:
+            _, evicted = _agents.popitem(last=False)
+            task = asyncio.get_running_loop().create_task(_close_agent(evicted))
+            _closing_agents.add(task)
+            task.add_done_callback(_closing_agents.discard)
+    else:
+        _agents.move_to_end(session_id)
+    return agent
+
+async def _load_session(session_id: str) -> BizMartAgent:
+    agent = _get_agent(session_id)
+    raw = await _state.get(f"session:{session_id}")
+    if raw:
+        agent.load_state(json.loads(raw))
+    else:
+        agent.load_state({})
     return agent
 
+async def _save_session(session_id: str, agent: BizMartAgent):
+    raw = json.dumps(agent.to_state(), separators=(",", ":")).encode("utf-8")
+    await _state.set(f"session:{session_id}", raw, ttl=SESSION_TTL_SECONDS)
+
 @app.get("/")
 async def root():
     return {
@@ -108,78 +261,353 @@ async def chat_endpoint(request: ChatRequest, http_request: Request):
         if not request.message or not request.message.strip():
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
-        agent = _get_agent(_get_session_id(http_request))
+        session_id = _get_session_id(http_request)
+        agent = await _load_session(session_id)
         response_text = await agent.chat(request.message)
+        await _save_session(session_id, agent)
         return ChatResponse(response=response_text)
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+MARKET_FIELDS = ("id", "pubkey", "title", "question", "pool", "ends_in", "type", "yes_percentage", "no_percentage")
+
+# Shown until the market state sync has loaded on-chain markets
+_DEMO_MARKET_ROWS = [
+    (1, None, "User Growth", "Will this project reach 50k Twitter followers in 90 days?",
+     "2,405 USDC", "14d", "Social", 67, 33),
+    (2, None, "Revenue Milestone", "Will this SaaS hit $3k MRR in 30 days?",
+     "1,120 USDC", "7d", "Revenue", 42, 58),
+    (3, None, "Product Launch", "Will the MVP ship before Q2 2025?",
+     "890 USDC", "21d", "Product", 78, 22),
+]
+
+def _ends_in(seconds: float) -> str:
+    if seconds <= 0:
+        return "ended"
+    if seconds >= 86400:
+        return f"{int(seconds // 86400)}d"
+    if seconds >= 3600:
+        return f"{int(seconds // 3600)}h"
+    return f"{max(1, int(seconds // 60))}m"
+
+def _market_rows() -> list[tuple]:
+    """
+    Active markets as MARKET_FIELDS tuples, soonest to end first.
+    """
+    if not market_state.markets:
+        return _DEMO_MARKET_ROWS
+    now = time.time()
+    active = sorted(
+        (m for m in market_state.markets.values() if m.status == "Active"),
+        key=lambda m: m.end_time,
+    )
+    return [_market_row(i, m, now) for i, m in enumerate(active, start=1)]
+
+def _market_row(i: int, m, now: float) -> tuple:
+    yes = round(100 * m.yes_pool / m.total_pool) if m.total_pool else 50
+    title = m.question if len(m.question) <= 48 else m.question[:45] + "..."
+    return (i, m.pubkey, title, m.question, format_usdc(m.total_pool),
+            _ends_in(m.end_time - now), "Onchain", yes, 100 - yes)
+
+_response_cache = ResponseCache()
+
+async def _conditional_get(request: Request, route: str, version_fn, render, wait_for_change=None) -> Response:
+    """
+    Serve a polled GET from pre-serialized bytes with ETag / If-None-Match.
+    With ?wait=N and a matching If-None-Match the request is held until the
+    version changes or N seconds pass (long-poll).
+    """
+    media_type, coding = negotiate(request)
+    version = version_fn()
+    etag = make_etag(route, version, media_type, coding)
+    wait = long_poll_seconds(request)
+    if wait and wait_for_change is not None and etag_matches(request, etag):
+        await wait_for_change(wait)
+        version = version_fn()
+        etag = make_etag(route, version, media_type, coding)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    body, headers = _response_cache.get_or_render(
+        route, version, media_type, coding, lambda: render(media_type, coding)
+    )
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={**headers, "ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+def _markets_version():
+    if not market_state.markets:
+        return "demo"
+    # ends_in is relative to now, so the rendered list also changes per minute
+    return (market_state.version, int(time.time() // 60))
+
+async def _wait_for_markets_change(timeout: float):
+    until_next_minute = 60 - time.time() % 60
+    await market_state.wait_for_change(market_state.version, min(timeout, until_next_minute))
+
 @app.get("/markets", response_model=List[Market])
-async def get_markets():
-    """
-    Get list of active prediction markets
-    """
-    return [
-        Market(
-            id=1,
-            title="User Growth",
-            question="Will this project reach 50k Twitter followers in 90 days?",
-            pool="2,405 USDC",
-            ends_in="14d",
-            type="Social",
-            yes_percentage=67,
-            no_percentage=33
-        ),
-        Market(
-            id=2,
-            title="Revenue Milestone",
-            question="Will this SaaS hit $3k MRR in 30 days?",
-            pool="1,120 USDC",
-            ends_in="7d",
-            type="Revenue",
-            yes_percentage=42,
-            no_percentage=58
-        ),
-        Market(
-            id=3,
-            title="Product Launch",
-            question="Will the MVP ship before Q2 2025?",
-            pool="890 USDC",
-            ends_in="21d",
-            type="Product",
-            yes_percentage=78,
-            no_percentage=22
-        )
+async def get_markets(request: Request):
+    """
+    Get list of active prediction markets.
+    Supports ?format=json|columnar|msgpack (or Accept), gzip/br compression,
+    ETag / If-None-Match and ?wait=N long-polling.
+    """
+    return await _conditional_get(
+        request,
+        "/markets",
+        _markets_version,
+        lambda media_type, coding: finish(encode_rows(media_type, MARKET_FIELDS, _market_rows()), coding),
+        _wait_for_markets_change,
+    )
+
+# Keyword / creator / status / end_time search, maintained from store changes
+market_search = MarketSearchIndex()
+market_state.add_listener(market_search.on_change)
+SEARCH_FIELDS = MARKET_FIELDS + ("creator", "status", "end_time", "total_pool")
+
+@app.get("/markets/search")
+async def search_markets(
+    request: Request,
+    q: str = "",
+    creator: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(Active|Resolved|Disputed)$"),
+    min_ends_in: Optional[int] = Query(None, description="Seconds until end_time, at least"),
+    max_ends_in: Optional[int] = Query(None, description="Seconds until end_time, at most"),
+    sort: str = Query("end_time", pattern="^-?(end_time|total_pool)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Search markets by question words (prefix match), creator, status and
+    time to end. Supports ?format=json|columnar|msgpack (or Accept).
+    """
+    now = time.time()
+    total, markets = market_search.search(
+        q,
+        creator=creator,
+        status=status,
+        ends_after=None if min_ends_in is None else int(now) + min_ends_in,
+        ends_before=None if max_ends_in is None else int(now) + max_ends_in,
+        sort=sort,
+        offset=offset,
+        limit=limit,
+    )
+    rows = [
+        _market_row(offset + i, m, now) + (m.creator, m.status, m.end_time, m.total_pool)
+        for i, m in enumerate(markets, start=1)
     ]
+    meta = {"total": total, "offset": offset, "limit": limit, "slot": market_state.slot}
+    return rows_response(request, SEARCH_FIELDS, rows, key="markets", meta=meta)
+
+# Push channel for market changes; shares one serialized update per change
+_market_push = MarketBroadcaster(market_state)
+MARKET_PUSH_KEEPALIVE_SECONDS = 15
+
+def _subscribe_markets(markets: Optional[str]):
+    wanted = [m for m in (markets or "").split(",") if m]
+    return _market_push.subscribe(wanted or None)
+
+@app.get("/markets/subscribe")
+async def subscribe_markets(http_request: Request, markets: Optional[str] = None):
+    """
+    Server-sent events with market pool, status and resolution changes.
+    Starts with the current state; ?markets=pk1,pk2 limits it to those markets.
+    """
+    try:
+        subscriber = _subscribe_markets(markets)
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            while not await http_request.is_disconnected():
+                batch = await subscriber.next_batch(MARKET_PUSH_KEEPALIVE_SECONDS)
+                if not batch:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"".join(update.sse for update in batch)
+        finally:
+            _market_push.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/markets/subscribe")
+async def subscribe_markets_ws(websocket: WebSocket, markets: Optional[str] = None):
+    """
+    WebSocket variant of /markets/subscribe; each message is one market update.
+    """
+    await websocket.accept()
+    try:
+        subscriber = _subscribe_markets(markets)
+    except TooManySubscribers as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    async def pump():
+        while True:
+            for update in await subscriber.next_batch(MARKET_PUSH_KEEPALIVE_SECONDS):
+                await websocket.send_text(update.json)
+
+    sender = asyncio.create_task(pump())
+    try:
+        # Incoming messages are ignored; reading notices disconnects while idle
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        _market_push.unsubscribe(subscriber)
 
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request):
+    """
+    Get platform statistics (maintained incrementally from program accounts).
+    Supports ETag / If-None-Match and ?wait=N long-polling.
+    """
+    return await _conditional_get(
+        request,
+        "/stats",
+        lambda: market_state.version,
+        lambda media_type, coding: finish(encode_value(media_type, aggregates.stats()), coding),
+        lambda timeout: market_state.wait_for_change(market_state.version, timeout),
+    )
+
+@app.get("/leaderboard")
+async def get_leaderboard(
+    by: str = Query("volume", pattern="^(volume|pnl)$"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    Top traders by volume or realized P&L (USDC base units)
+    """
+    return {"by": by, "slot": market_state.slot, "traders": aggregates.leaderboard(by, limit)}
+
+TRADE_INDEXER_ENABLED = os.getenv("TRADE_INDEXER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Decoded transaction history, filled by the indexer and read by the trade endpoints
+_trades = TradeStore()
+_trade_indexer: Optional[TradeIndexer] = None
+
+@app.on_event("startup")
+async def start_trade_indexer():
+    global _trade_indexer
+    if not TRADE_INDEXER_ENABLED:
+        return
+    orchestrator = BizMartOrchestrator()
+    if not orchestrator.program_id:
+        print("Warning: SOLANA_PROGRAM_ID not set, trade indexer disabled")
+        return
+    _trade_indexer = TradeIndexer(orchestrator, _trades)
+    _trade_indexer.start()
+
+@app.on_event("shutdown")
+async def stop_trade_indexer():
+    if _trade_indexer is not None:
+        await _trade_indexer.stop()
+        await _trade_indexer.orchestrator.close()
+    _trades.close()
+
+async def _trades_response(request: Request, column: str, pubkey: str, limit: int, cursor: Optional[str]):
+    try:
+        rows, next_cursor = await _trades.trades(column, pubkey, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    meta = {column: pubkey, "next_cursor": next_cursor}
+    return rows_response(request, TRADE_FIELDS, rows, key="trades", meta=meta)
+
+@app.get("/market/{pubkey}/trades")
+async def get_market_trades(
+    request: Request,
+    pubkey: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """
+    Indexed instruction history of a market, newest first.
+    Pass next_cursor back as ?cursor= for the next page.
+    """
+    return await _trades_response(request, "market", pubkey, limit, cursor)
+
+@app.get("/user/{pubkey}/trades")
+async def get_user_trades(
+    request: Request,
+    pubkey: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """
+    Indexed instruction history of a wallet, newest first.
+    Pass next_cursor back as ?cursor= for the next page.
     """
-    Get platform statistics
+    return await _trades_response(request, "user", pubkey, limit, cursor)
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Runtime metrics for backend subsystems
     """
+    # None until the first chat builds it (never without OPENROUTER_API_KEY)
+    governor = current_governor()
     return {
-        "active_markets": 127,
-        "total_volume": "45,200 USDC",
-        "total_traders": 1834,
-        "markets_resolved": 89
+        "admission": _admission.stats(),
+        "llm": governor.metrics() if governor is not None else None,
+        "jobs": _jobs.stats(),
+        "payers": get_payer_pool().stats(),
+        "prevalidation": prevalidation.stats,
+        "market_push": _market_push.stats(),
+        "market_search": market_search.stats(),
+        "expiry": _expiry.stats(),
+        "trade_indexer": await _trade_indexer.stats() if _trade_indexer is not None else None,
     }
 
+PROGRAM_STATUS_TTL_SECONDS = float(os.getenv("PROGRAM_STATUS_TTL_SECONDS", "30"))
+_program_status = {"value": None, "version": None, "fetched": 0.0}
+_program_status_lock = asyncio.Lock()
+
+async def _refresh_program_status():
+    """
+    Refetch the program account at most once per PROGRAM_STATUS_TTL_SECONDS;
+    concurrent pollers share one RPC call.
+    """
+    async with _program_status_lock:
+        if _program_status["value"] is not None and time.monotonic() - _program_status["fetched"] < PROGRAM_STATUS_TTL_SECONDS:
+            return
+        agent = _get_agent("system")
+        value = await agent.orchestrator.get_program_status()
+        _program_status["value"] = value
+        _program_status["version"] = hashlib.blake2b(
+            json.dumps(value, sort_keys=True).encode(), digest_size=8
+        ).hexdigest()
+        _program_status["fetched"] = time.monotonic()
+
 @app.get("/program/status")
-async def get_program_status():
+async def get_program_status(request: Request):
     """
-    Check deployed Solana program status
+    Check deployed Solana program status (cached, supports ETag / If-None-Match)
     """
-    agent = _get_agent("system")
-    return await agent.orchestrator.get_program_status()
+    await _refresh_program_status()
+    return await _conditional_get(
+        request,
+        "/program/status",
+        lambda: _program_status["version"],
+        lambda media_type, coding: finish(encode_value(media_type, _program_status["value"]), coding),
+    )
 
 @app.get("/program/accounts")
-async def get_program_accounts():
+async def get_program_accounts(request: Request):
     """
-    List program-owned accounts (read-only)
+    List program-owned accounts (read-only).
+    Supports ?format=json|columnar|msgpack (or Accept) and gzip/br compression.
     """
     agent = _get_agent("system")
-    return await agent.orchestrator.get_program_accounts()
+    meta, rows = await agent.orchestrator.get_program_account_rows()
+    return rows_response(request, PROGRAM_ACCOUNT_FIELDS, rows, key="accounts", meta=meta)
 
 @app.post("/program/pdas")
 async def get_program_pdas(request: PdaRequest):
@@ -198,59 +626,257 @@ async def get_program_pdas(request: PdaRequest):
         )
     return result
 
+# On-chain writes by kind; payload is the request body as a dict
+_WRITE_HANDLERS = {
+    "market/create": lambda o, p: o.initialize_market(p["question"], p["duration"]),
+    "market/resolve": lambda o, p: o.resolve_market(p["market_pubkey"], p["outcome"]),
+    "market/resolve_batch": lambda o, p: o.resolve_markets(p["markets"]),
+    "market/bet": lambda o, p: o.place_bet(
+        p["market_pubkey"],
+        p["user_pubkey"],
+        p["user_usdc"],
+        p["vault_usdc"],
+        p["user_position"],
+        p["amount"],
+        p["bet_on_yes"],
+    ),
+    "market/claim": lambda o, p: o.claim_winnings(
+        p["market_pubkey"],
+        p["user_pubkey"],
+        p["user_usdc"],
+        p["vault_usdc"],
+        p["user_position"],
+    ),
+}
+
+def _run_write(kind: str, payload: dict):
+    return _WRITE_HANDLERS[kind](_get_agent("system").orchestrator, payload)
+
+_jobs = JobQueue({kind: (lambda p, kind=kind: _run_write(kind, p)) for kind in _WRITE_HANDLERS})
+
+# Auto-resolution of expired markets. Off by default: enable it in exactly one
+# process, since every enabled worker would submit the same resolves. Outcomes
+# live in the state backend, so /market/outcome may hit any worker as long as
+# STATE_BACKEND is shared.
+EXPIRY_SCHEDULER_ENABLED = os.getenv("EXPIRY_SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+_expiry = ExpiryScheduler(market_state, _state, _jobs.submit, _jobs.get)
+
+@app.on_event("startup")
+async def start_jobs():
+    await _jobs.start()
+    get_payer_pool().start(os.getenv("SOLANA_RPC_URL", "https://api.devnet.solana.com"))
+    if EXPIRY_SCHEDULER_ENABLED:
+        _expiry.start()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await _expiry.stop()
+    await _jobs.stop()
+    await get_payer_pool().stop()
+
+async def _idempotent(scope: str, key: Optional[str], request: BaseModel, response: Response, func):
+    """
+    Run an on-chain write at most once per Idempotency-Key.
+    """
+    try:
+        if not key:
+            return await func()
+        result, replayed = await _idempotency.run(scope, key, request.model_dump_json(), func)
+    except OutcomeUnknown as e:
+        # Sent but unconfirmed; the detail names the signature to check
+        raise HTTPException(status_code=504, detail=str(e))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def _write(kind: str, request: BaseModel, response: Response, idempotency_key: Optional[str], prefer: Optional[str]):
+    """
+    Execute a write inline, or queue it and return a job when the client
+    sends `Prefer: respond-async`.
+    """
+    payload = request.model_dump()
+    if prefer and "respond-async" in prefer.lower():
+        async def submit():
+            try:
+                job = await _jobs.submit(kind, payload)
+            except QueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+            return {"job_id": job["job_id"], "status": job["status"], "status_url": f"/jobs/{job['job_id']}"}
+        response.status_code = 202
+        return await _idempotent(f"{kind}:async", idempotency_key, request, response, submit)
+    return await _idempotent(kind, idempotency_key, request, response, lambda: _run_write(kind, payload))
+
 @app.post("/market/create")
-async def create_market(request: CreateMarketRequest):
+async def create_market(
+    request: CreateMarketRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    prefer: Optional[str] = Header(None),
+):
     """
     Initialize a new market on-chain (server signer).
     """
-    agent = _get_agent("system")
-    return await agent.orchestrator.initialize_market(request.question, request.duration)
+    return await _write("market/create", request, response, idempotency_key, prefer)
 
 @app.post("/market/resolve")
-async def resolve_market(request: ResolveMarketRequest):
+async def resolve_market(
+    request: ResolveMarketRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    prefer: Optional[str] = Header(None),
+):
     """
     Resolve a market on-chain (server signer).
     """
-    agent = _get_agent("system")
-    return await agent.orchestrator.resolve_market(request.market_pubkey, request.outcome)
+    return await _write("market/resolve", request, response, idempotency_key, prefer)
+
+# Registering outcomes decides how markets resolve; unset disables /market/outcome
+MARKET_ADMIN_TOKEN = os.getenv("MARKET_ADMIN_TOKEN", "")
+
+@app.post("/market/outcome")
+async def register_market_outcome(
+    request: ResolveMarketRequest,
+    admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+):
+    """
+    Register the outcome to resolve a market with automatically once its
+    end_time passes (resolved right away if it already expired). Admin only.
+    """
+    if not (MARKET_ADMIN_TOKEN and admin_token and secrets.compare_digest(admin_token, MARKET_ADMIN_TOKEN)):
+        raise HTTPException(status_code=403, detail="X-Admin-Token required")
+    try:
+        Pubkey.from_string(request.market_pubkey)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid market pubkey")
+    market = market_state.markets.get(request.market_pubkey)
+    if market is not None and market.status != "Active":
+        raise HTTPException(status_code=409, detail=f"Market is {market.status}")
+    if not await _expiry.running():
+        raise HTTPException(
+            status_code=503,
+            detail="Expiry scheduler is not running (EXPIRY_SCHEDULER_ENABLED)",
+        )
+    await _expiry.register_outcome(request.market_pubkey, request.outcome)
+    return {"market_pubkey": request.market_pubkey, "outcome": request.outcome, "registered": True}
 
 @app.post("/market/bet")
-async def place_bet(request: PlaceBetRequest):
+async def place_bet(
+    request: PlaceBetRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    prefer: Optional[str] = Header(None),
+):
     """
     Place a bet on-chain (server signer for payer only).
     """
-    agent = _get_agent("system")
-    return await agent.orchestrator.place_bet(
-        request.market_pubkey,
-        request.user_pubkey,
-        request.user_usdc,
-        request.vault_usdc,
-        request.user_position,
-        request.amount,
-        request.bet_on_yes,
-    )
+    return await _write("market/bet", request, response, idempotency_key, prefer)
 
 @app.post("/market/claim")
-async def claim_winnings(request: ClaimWinningsRequest):
+async def claim_winnings(
+    request: ClaimWinningsRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    prefer: Optional[str] = Header(None),
+):
     """
     Claim winnings on-chain (server signer for payer only).
     """
-    agent = _get_agent("system")
-    return await agent.orchestrator.claim_winnings(
-        request.market_pubkey,
-        request.user_pubkey,
-        request.user_usdc,
-        request.vault_usdc,
-        request.user_position,
+    return await _write("market/claim", request, response, idempotency_key, prefer)
+
+@app.get("/jobs/stream")
+async def stream_jobs(http_request: Request, job_id: Optional[str] = None):
+    """
+    Server-sent events with job status updates (optionally for one job).
+    """
+    async def events():
+        q = _jobs.subscribe()
+        try:
+            while not await http_request.is_disconnected():
+                try:
+                    job = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if job_id and job["job_id"] != job_id:
+                    continue
+                yield f"event: job\ndata: {json.dumps(job)}\n\n"
+        finally:
+            _jobs.unsubscribe(q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status and result of a queued on-chain write.
+    """
+    job = await _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _require_trace_admin(request: Request):
+    if not tracing.authorized(request.headers.get("x-debug-trace")):
+        raise HTTPException(status_code=403, detail="X-Debug-Trace admin token required")
+
+@app.get("/debug/traces")
+async def list_traces(request: Request):
+    """
+    Recently recorded request traces (admin only).
+    """
+    _require_trace_admin(request)
+    return tracing.list_traces()
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str, request: Request):
+    """
+    One trace in Chrome trace-event format (open in chrome://tracing or Perfetto).
+    """
+    _require_trace_admin(request)
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return JSONResponse(
+        trace.to_chrome(),
+        headers={"Content-Disposition": f'attachment; filename="trace-{trace_id}.json"'},
+    )
+
+@app.get("/debug/traces/{trace_id}/profile")
+async def get_trace_profile(trace_id: str, request: Request, format: str = "text"):
+    """
+    cProfile output of a profiled request: text summary, or ?format=pstats
+    for a file loadable with pstats / snakeviz.
+    """
+    _require_trace_admin(request)
+    trace = tracing.get_trace(trace_id)
+    if trace is None or trace.profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return Response(
+            content=marshal.dumps(trace.profile.stats),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{trace_id}.pstats"'},
+        )
+    return Response(content=trace.profile_text(), media_type="text/plain")
+
 @app.post("/reset")
 async def reset_agent(http_request: Request):
     """
     Reset the agent conversation (for testing)
     """
     session_id = _get_session_id(http_request)
-    _agents[session_id] = BizMartAgent()
+    _get_agent(session_id).load_state({})
+    await _state.delete(f"session:{session_id}")
     return {"message": f"Agent reset successfully for session {session_id}"}
 
 @app.get("/state")
@@ -258,7 +884,7 @@ async def get_state(http_request: Request):
     """
     Get current collection state for UI form view.
     """
-    agent = _get_agent(_get_session_id(http_request))
+    agent = await _load_session(_get_session_id(http_request))
     return agent.get_state()
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from aggregates import format_usdc
+from market_state import MarketAccount, MarketStateStore
+from response_encoding import dumps_json
+
+# Updates buffered per subscriber before it falls back to latest-state-only
+MARKET_PUSH_QUEUE_SIZE = int(os.getenv("MARKET_PUSH_QUEUE_SIZE", "64"))
+MARKET_PUSH_MAX_SUBSCRIBERS = int(os.getenv("MARKET_PUSH_MAX_SUBSCRIBERS", "10000"))
+
+
+class TooManySubscribers(Exception):
+    """Raised when MARKET_PUSH_MAX_SUBSCRIBERS are already connected."""
+
+
+class MarketUpdate:
+    """
+    One market change, serialized once and shared by every subscriber.
+    """
+
+    __slots__ = ("pubkey", "seq", "published", "json", "sse")
+
+    def __init__(self, pubkey: str, seq: int, payload: dict):
+        self.pubkey = pubkey
+        self.seq = seq
+        self.published = time.perf_counter()
+        self.json = dumps_json({"seq": seq, **payload}).decode("utf-8")
+        self.sse = f"id: {seq}\nevent: market\ndata: {self.json}\n\n".encode("utf-8")
+
+
+def market_payload(market: MarketAccount) -> dict:
+    yes = round(100 * market.yes_pool / market.total_pool) if market.total_pool else 50
+    return {
+        "pubkey": market.pubkey,
+        "question": market.question,
+        "status": market.status,
+        "end_time": market.end_time,
+        "pool": format_usdc(market.total_pool),
+        "total_pool": market.total_pool,
+        "yes_pool": market.yes_pool,
+        "no_pool": market.no_pool,
+        "yes_percentage": yes,
+        "no_percentage": 100 - yes,
+        "outcome": market.outcome if market.status == "Resolved" else None,
+    }
+
+
+class Subscriber:
+    """
+    Bounded per-connection buffer. When the queue is full the subscriber
+    switches to latest-state-only: pending updates are coalesced to the
+    newest one per market until the consumer catches up.
+    """
+
+    def __init__(self, markets: Optional[set[str]], queue_size: int):
+        self.markets = markets
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque[MarketUpdate] = deque()
+        self._latest: dict[str, MarketUpdate] = {}
+        self._lagging = False
+        self._ready = asyncio.Event()
+
+    def push(self, update: MarketUpdate):
+        if self._lagging:
+            if update.pubkey in self._latest:
+                self.dropped += 1
+            self._latest[update.pubkey] = update
+        elif len(self._queue) < self.queue_size:
+            self._queue.append(update)
+        else:
+            self._lagging = True
+            for queued in self._queue:
+                if queued.pubkey in self._latest:
+                    self.dropped += 1
+                self._latest[queued.pubkey] = queued
+            self._queue.clear()
+            if update.pubkey in self._latest:
+                self.dropped += 1
+            self._latest[update.pubkey] = update
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> list[MarketUpdate]:
+        """
+        Wait for updates and drain them. Returns [] on timeout.
+        """
+        if not self._queue and not self._latest:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        if self._lagging:
+            batch = sorted(self._latest.values(), key=lambda u: u.seq)
+            self._latest.clear()
+            self._lagging = False
+        else:
+            batch = list(self._queue)
+            self._queue.clear()
+        return batch
+
+
+class MarketBroadcaster:
+    """
+    Fans out market changes from the MarketStateStore to push subscribers.
+
+    Subscribers to specific markets are indexed by pubkey, so an update only
+    touches the connections that asked for it. The newest update per market
+    is kept to give new subscribers an initial snapshot without
+    re-serializing anything.
+    """
+
+    def __init__(
+        self,
+        store: MarketStateStore,
+        queue_size: int = MARKET_PUSH_QUEUE_SIZE,
+        max_subscribers: int = MARKET_PUSH_MAX_SUBSCRIBERS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.seq = 0
+        self.published = 0
+        self._latest: dict[str, MarketUpdate] = {}
+        self._all: set[Subscriber] = set()
+        self._by_market: dict[str, set[Subscriber]] = {}
+        self._count = 0
+        for market in store.markets.values():
+            self._latest[market.pubkey] = self._update(market.pubkey, market_payload(market))
+        store.add_listener(self.on_change)
+
+    def _update(self, pubkey: str, payload: dict) -> MarketUpdate:
+        self.seq += 1
+        return MarketUpdate(pubkey, self.seq, payload)
+
+    def on_change(self, kind: str, old, new):
+        if kind != "market":
+            return
+        if new is None:
+            update = self._update(old.pubkey, {"pubkey": old.pubkey, "removed": True})
+            self._latest.pop(old.pubkey, None)
+        else:
+            update = self._update(new.pubkey, market_payload(new))
+            self._latest[new.pubkey] = update
+        self.publish(update)
+
+    def publish(self, update: MarketUpdate):
+        self.published += 1
+        for subscriber in self._all:
+            subscriber.push(update)
+        for subscriber in self._by_market.get(update.pubkey, ()):
+            subscriber.push(update)
+
+    def subscribe(self, markets: Optional[Iterable[str]] = None) -> Subscriber:
+        if self._count >= self.max_subscribers:
+            raise TooManySubscribers(f"{self.max_subscribers} market subscribers already connected")
+        wanted = set(markets) if markets else None
+        subscriber = Subscriber(wanted, self.queue_size)
+        if wanted is None:
+            self._all.add(subscriber)
+            snapshot = list(self._latest.values())
+        else:
+            for pubkey in wanted:
+                self._by_market.setdefault(pubkey, set()).add(subscriber)
+            snapshot = [self._latest[p] for p in wanted if p in self._latest]
+        self._count += 1
+        for update in sorted(snapshot, key=lambda u: u.seq):
+            subscriber.push(update)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        if subscriber.markets is None:
+            self._all.discard(subscriber)
+        else:
+            for pubkey in subscriber.markets:
+                subscribers = self._by_market.get(pubkey)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_market[pubkey]
+        self._count -= 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "market_filters": len(self._by_market),
+            "published": self.published,
+            "seq": self.seq,
+        }
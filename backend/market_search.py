@@ -0,0 +1,238 @@
+import bisect
+import re
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from market_state import MarketAccount
+
+SORTS = ("end_time", "-end_time", "total_pool", "-total_pool")
+_TOKEN = re.compile(r"\w+")
+# Candidate sets smaller than this share of the index are sorted directly;
+# larger ones are filtered while walking the sorted index.
+_SORT_CANDIDATES_RATIO = 0.125
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class _SortedIndex:
+    """
+    (value, pubkey) pairs kept sorted with bisect. Additions are buffered and
+    merged on the next read, so bulk loads sort once instead of paying an
+    insort per market.
+    """
+
+    def __init__(self):
+        self._entries: list[tuple[int, str]] = []
+        self._pending: list[tuple[int, str]] = []
+
+    @property
+    def entries(self) -> list[tuple[int, str]]:
+        if self._pending:
+            if len(self._pending) < 64:
+                for entry in self._pending:
+                    bisect.insort(self._entries, entry)
+            else:
+                self._entries.extend(self._pending)
+                self._entries.sort()
+            self._pending = []
+        return self._entries
+
+    def add(self, value: int, pubkey: str):
+        self._pending.append((value, pubkey))
+
+    def remove(self, value: int, pubkey: str):
+        entries = self.entries
+        i = bisect.bisect_left(entries, (value, pubkey))
+        if i < len(entries) and entries[i] == (value, pubkey):
+            del entries[i]
+
+    def range(self, low: Optional[int], high: Optional[int]) -> tuple[int, int]:
+        """
+        Slice bounds of entries with low <= value <= high.
+        """
+        entries = self.entries
+        start = 0 if low is None else bisect.bisect_left(entries, (low, ""))
+        end = len(entries) if high is None else bisect.bisect_right(entries, (high, "\uffff"))
+        return start, end
+
+
+class MarketSearchIndex:
+    """
+    Incrementally maintained search over markets in the MarketStateStore.
+
+    Question tokens go into an inverted index whose vocabulary is kept sorted,
+    so every query token matches as a prefix with two bisects. Creator and
+    status are exact-match indexes; end_time and total_pool are sorted
+    indexes used for range filtering and ordering.
+    """
+
+    def __init__(self):
+        self.markets: dict[str, MarketAccount] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._vocabulary: list[str] = []
+        self._by_creator: dict[str, set[str]] = defaultdict(set)
+        self._by_status: dict[str, set[str]] = defaultdict(set)
+        self._by_end_time = _SortedIndex()
+        self._by_pool = _SortedIndex()
+
+    def on_change(self, kind: str, old, new):
+        if kind != "market":
+            return
+        if old is not None and new is not None and old.question == new.question and old.pubkey in self.markets:
+            # Bets and resolutions: only the pool and status indexes move
+            self.markets[new.pubkey] = new
+            if old.status != new.status:
+                _discard(self._by_status, old.status, old.pubkey)
+                self._by_status[new.status].add(new.pubkey)
+            if old.total_pool != new.total_pool:
+                self._by_pool.remove(old.total_pool, old.pubkey)
+                self._by_pool.add(new.total_pool, new.pubkey)
+            if old.end_time != new.end_time:
+                self._by_end_time.remove(old.end_time, old.pubkey)
+                self._by_end_time.add(new.end_time, new.pubkey)
+            if old.creator != new.creator:
+                _discard(self._by_creator, old.creator, old.pubkey)
+                self._by_creator[new.creator].add(new.pubkey)
+            return
+        if old is not None:
+            self._remove(old)
+        if new is not None:
+            self._add(new)
+
+    def _add(self, market: MarketAccount):
+        pubkey = market.pubkey
+        self.markets[pubkey] = market
+        for token in set(tokenize(market.question)):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+            postings.add(pubkey)
+        self._by_creator[market.creator].add(pubkey)
+        self._by_status[market.status].add(pubkey)
+        self._by_end_time.add(market.end_time, pubkey)
+        self._by_pool.add(market.total_pool, pubkey)
+
+    def _remove(self, market: MarketAccount):
+        pubkey = market.pubkey
+        if self.markets.pop(pubkey, None) is None:
+            return
+        for token in set(tokenize(market.question)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(pubkey)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[i]
+        _discard(self._by_creator, market.creator, pubkey)
+        _discard(self._by_status, market.status, pubkey)
+        self._by_end_time.remove(market.end_time, pubkey)
+        self._by_pool.remove(market.total_pool, pubkey)
+
+    def _prefix_matches(self, prefix: str) -> set[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\uffff")
+        words = self._vocabulary[start:end]
+        if len(words) == 1:
+            return self._postings[words[0]]
+        matches: set[str] = set()
+        for word in words:
+            matches |= self._postings[word]
+        return matches
+
+    def search(
+        self,
+        query: str = "",
+        creator: Optional[str] = None,
+        status: Optional[str] = None,
+        ends_after: Optional[int] = None,
+        ends_before: Optional[int] = None,
+        sort: str = "end_time",
+        offset: int = 0,
+        limit: int = 20,
+    ) -> tuple[int, list[MarketAccount]]:
+        """
+        Markets whose question contains every query token as a word prefix,
+        filtered by creator, status and end_time range. Returns the total
+        match count and one page in `sort` order.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        sets: list[set[str]] = [self._prefix_matches(token) for token in set(tokenize(query))]
+        if creator is not None:
+            sets.append(self._by_creator.get(creator, set()))
+        if status is not None:
+            sets.append(self._by_status.get(status, set()))
+
+        descending = sort.startswith("-")
+        index = self._by_end_time if sort.lstrip("-") == "end_time" else self._by_pool
+        start, end = self._by_end_time.range(ends_after, ends_before)
+        timed = ends_after is not None or ends_before is not None
+
+        if not sets:
+            if not timed or index is self._by_end_time:
+                # No set filters: the page is a slice of the sorted index
+                if index is not self._by_end_time:
+                    start, end = 0, len(index.entries)
+                total = end - start
+                if descending:
+                    start, end = max(start, end - offset - limit), end - offset
+                else:
+                    start, end = start + offset, min(end, start + offset + limit)
+                sliced = [self.markets[p] for _, p in index.entries[start:end]] if start < end else []
+                return total, sliced[::-1] if descending else sliced
+        if timed:
+            sets.append({p for _, p in self._by_end_time.entries[start:end]})
+        sets.sort(key=len)
+        # Index sets are only read; the first intersection makes a new set
+        candidates = sets[0]
+        for other in sets[1:]:
+            candidates = candidates & other
+            if not candidates:
+                return 0, []
+        total = len(candidates)
+        wanted = offset + limit
+        if total <= offset:
+            return total, []
+
+        if total < _SORT_CANDIDATES_RATIO * len(self.markets):
+            matches = [self.markets[p] for p in candidates]
+            if index is self._by_end_time:
+                key = lambda m: (m.end_time, m.pubkey)
+            else:
+                key = lambda m: (m.total_pool, m.pubkey)
+            matches.sort(key=key, reverse=descending)
+            return total, matches[offset:wanted]
+
+        # Dense matches: walk the sorted index until the page is filled
+        entries: Iterable = index.entries
+        if index is self._by_end_time:
+            entries = entries[start:end]
+        if descending:
+            entries = reversed(entries)
+        page: list[MarketAccount] = []
+        seen = 0
+        for _, pubkey in entries:
+            if pubkey not in candidates:
+                continue
+            if seen >= offset:
+                page.append(self.markets[pubkey])
+                if len(page) == limit:
+                    break
+            seen += 1
+        return total, page
+
+    def stats(self) -> dict:
+        return {"markets": len(self.markets), "tokens": len(self._vocabulary)}
+
+
+def _discard(index: dict[str, set[str]], key: str, pubkey: str):
+    members = index.get(key)
+    if members is not None:
+        members.discard(pubkey)
+        if not members:
+            del index[key]
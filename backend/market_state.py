@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import os
+import struct
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from solders.pubkey import Pubkey
+
+# Anchor account discriminators: sha256("account:<Name>")[:8]
+MARKET_DISCRIMINATOR = hashlib.sha256(b"account:Market").digest()[:8]
+POSITION_DISCRIMINATOR = hashlib.sha256(b"account:UserPosition").digest()[:8]
+MARKET_STATUSES = ("Active", "Resolved", "Disputed")
+
+STATE_SYNC_INTERVAL_SECONDS = float(os.getenv("STATE_SYNC_INTERVAL_SECONDS", "15"))
+# Beyond this many new signatures a snapshot catch-up falls back to a full scan
+STATE_CATCH_UP_MAX_SIGNATURES = int(os.getenv("STATE_CATCH_UP_MAX_SIGNATURES", "2000"))
+
+
+@dataclass(slots=True)
+class MarketAccount:
+    pubkey: str
+    creator: str
+    question: str
+    end_time: int
+    status: str
+    total_pool: int
+    yes_pool: int
+    no_pool: int
+    outcome: bool
+
+
+@dataclass(slots=True)
+class PositionAccount:
+    pubkey: str
+    user: str
+    market: str
+    yes_amount: int
+    no_amount: int
+    claimed: bool
+
+
+# Listener signature: (kind, old, new) where kind is "market" or "position".
+# old is None for new accounts, new is None for closed accounts.
+StateListener = Callable[[str, object, object], None]
+
+
+def _read_pubkey(data: bytes, offset: int) -> tuple[str, int]:
+    return str(Pubkey.from_bytes(data[offset:offset + 32])), offset + 32
+
+
+def decode_market(pubkey: str, data: bytes) -> MarketAccount:
+    """
+    Decode a Market account (layout from idl/bizfi_market.json).
+    """
+    offset = 8
+    creator, offset = _read_pubkey(data, offset)
+    (question_len,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    question = data[offset:offset + question_len].decode("utf-8")
+    offset += question_len
+    end_time, status, total_pool, yes_pool, no_pool, outcome = struct.unpack_from("<qBQQQ?", data, offset)
+    return MarketAccount(
+        pubkey=pubkey,
+        creator=creator,
+        question=question,
+        end_time=end_time,
+        status=MARKET_STATUSES[status],
+        total_pool=total_pool,
+        yes_pool=yes_pool,
+        no_pool=no_pool,
+        outcome=outcome,
+    )
+
+
+def decode_position(pubkey: str, data: bytes) -> PositionAccount:
+    """
+    Decode a UserPosition account (layout from idl/bizfi_market.json).
+    """
+    offset = 8
+    user, offset = _read_pubkey(data, offset)
+    market, offset = _read_pubkey(data, offset)
+    yes_amount, no_amount, claimed = struct.unpack_from("<QQ?", data, offset)
+    return PositionAccount(
+        pubkey=pubkey,
+        user=user,
+        market=market,
+        yes_amount=yes_amount,
+        no_amount=no_amount,
+        claimed=claimed,
+    )
+
+
+class MarketStateStore:
+    """
+    In-memory view of decoded program accounts.
+
+    Listeners are only notified for accounts whose raw data changed, so derived
+    views can be maintained incrementally instead of rescanning every account.
+    """
+
+    def __init__(self):
+        self.markets: dict[str, MarketAccount] = {}
+        self.positions: dict[str, PositionAccount] = {}
+        self.slot = 0
+        # Newest program transaction signature the state is known to include
+        self.signature: Optional[str] = None
+        self.version = 0
+        self._digests: dict[str, bytes] = {}
+        self._listeners: list[StateListener] = []
+        self._waiters: list[asyncio.Future] = []
+
+    def add_listener(self, listener: StateListener):
+        self._listeners.append(listener)
+
+    def _notify(self, kind: str, old, new):
+        for listener in self._listeners:
+            try:
+                listener(kind, old, new)
+            except Exception as e:
+                print(f"Warning: state listener failed: {e}")
+
+    def apply_account(self, pubkey: str, data: bytes) -> bool:
+        """
+        Apply one raw account. Returns True if the decoded state changed.
+        """
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if self._digests.get(pubkey) == digest:
+            return False
+        discriminator = data[:8]
+        try:
+            if discriminator == MARKET_DISCRIMINATOR:
+                new = decode_market(pubkey, data)
+                old = self.markets.get(pubkey)
+                self.markets[pubkey] = new
+                kind = "market"
+            elif discriminator == POSITION_DISCRIMINATOR:
+                new = decode_position(pubkey, data)
+                old = self.positions.get(pubkey)
+                self.positions[pubkey] = new
+                kind = "position"
+            else:
+                return False
+        except Exception as e:
+            print(f"Warning: could not decode account {pubkey}: {e}")
+            return False
+        self._digests[pubkey] = digest
+        self._notify(kind, old, new)
+        return True
+
+    def remove_account(self, pubkey: str) -> bool:
+        self._digests.pop(pubkey, None)
+        if pubkey in self.markets:
+            self._notify("market", self.markets.pop(pubkey), None)
+            return True
+        if pubkey in self.positions:
+            self._notify("position", self.positions.pop(pubkey), None)
+            return True
+        return False
+
+    def apply_snapshot(self, accounts: Iterable[tuple[str, bytes]], slot: int) -> int:
+        """
+        Apply a full account listing: changed accounts are updated, accounts
+        missing from the listing are removed. Returns the number of changes.
+        """
+        seen = set()
+        changed = 0
+        for pubkey, data in accounts:
+            seen.add(pubkey)
+            if self.apply_account(pubkey, data):
+                changed += 1
+        for pubkey in [k for k in self._digests if k not in seen]:
+            if self.remove_account(pubkey):
+                changed += 1
+        self.slot = max(self.slot, slot)
+        if changed:
+            self._bump_version()
+        return changed
+
+    def digests(self) -> dict[str, bytes]:
+        """
+        Copy of the data digest of every account, by pubkey.
+        """
+        return dict(self._digests)
+
+    def load(
+        self,
+        markets: dict[str, MarketAccount],
+        positions: dict[str, PositionAccount],
+        digests: dict[str, bytes],
+        slot: int,
+        signature: Optional[str],
+    ):
+        """
+        Replace the contents with already decoded accounts (e.g. from a
+        snapshot); listeners see every account as new.
+        """
+        self.markets = markets
+        self.positions = positions
+        self._digests = digests
+        self.slot = slot
+        self.signature = signature
+        for market in markets.values():
+            self._notify("market", None, market)
+        for position in positions.values():
+            self._notify("position", None, position)
+        self._bump_version()
+
+    def apply_changes(self, accounts: Iterable[tuple[str, Optional[bytes]]], slot: int) -> int:
+        """
+        Apply a partial listing; None data means the account was closed.
+        Returns the number of changes.
+        """
+        changed = 0
+        for pubkey, data in accounts:
+            if data is None:
+                changed += self.remove_account(pubkey)
+            elif self.apply_account(pubkey, data):
+                changed += 1
+        self.slot = max(self.slot, slot)
+        if changed:
+            self._bump_version()
+        return changed
+
+    def _bump_version(self):
+        self.version += 1
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(self.version)
+
+    async def wait_for_change(self, version: int, timeout: float) -> bool:
+        """
+        Wait until the store moves past `version`. Returns False on timeout.
+        """
+        if self.version != version:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+
+class MarketStateSync:
+    """
+    Periodically pulls program accounts and feeds them into a MarketStateStore.
+    """
+
+    def __init__(self, orchestrator, store: MarketStateStore, interval: float = STATE_SYNC_INTERVAL_SECONDS):
+        self.orchestrator = orchestrator
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> int:
+        # Read the newest signature first: the scan then includes at least its effects
+        signature = await self.orchestrator.get_latest_program_signature()
+        accounts, slot = await self.orchestrator.fetch_program_account_data()
+        changed = self.store.apply_snapshot(accounts, slot)
+        if signature:
+            self.store.signature = signature
+        return changed
+
+    async def catch_up(self, max_signatures: int = STATE_CATCH_UP_MAX_SIGNATURES) -> bool:
+        """
+        Bring a store loaded from a snapshot up to date by refetching only the
+        accounts touched by program transactions after store.signature.
+        Returns False when a full scan is needed instead.
+        """
+        if not self.store.signature:
+            return False
+        delta = await self.orchestrator.fetch_accounts_changed_since(self.store.signature, max_signatures)
+        if delta is None:
+            return False
+        accounts, slot, signature = delta
+        self.store.apply_changes(accounts, slot)
+        self.store.signature = signature
+        return True
+
+    async def _run(self, warm: bool):
+        if warm:
+            try:
+                if await self.catch_up():
+                    await asyncio.sleep(self.interval)
+            except Exception as e:
+                print(f"Warning: market state catch-up failed: {e}")
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Warning: market state sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, warm: bool = False):
+        """
+        Start syncing. A warm store (loaded from a snapshot) is caught up from
+        its signature first and only rescanned after one interval.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(warm))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Process-wide store shared by the API and the orchestrator.
+store = MarketStateStore()
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+from solana.rpc.async_api import AsyncClient
+from solders.keypair import Keypair
+
+load_dotenv()
+
+# round_robin | least_loaded
+SOLANA_PAYER_STRATEGY = os.getenv("SOLANA_PAYER_STRATEGY", "least_loaded")
+# Payers below this balance are taken out of rotation (0.05 SOL)
+SOLANA_PAYER_MIN_LAMPORTS = int(os.getenv("SOLANA_PAYER_MIN_LAMPORTS", "50000000"))
+SOLANA_PAYER_MAX_INFLIGHT = int(os.getenv("SOLANA_PAYER_MAX_INFLIGHT", "4"))
+SOLANA_PAYER_REFRESH_SECONDS = float(os.getenv("SOLANA_PAYER_REFRESH_SECONDS", "30"))
+
+
+class NoPayerAvailable(Exception):
+    """Raised when every payer is out of rotation."""
+
+
+class _Payer:
+    __slots__ = ("keypair", "pubkey", "in_flight", "sent", "balance", "active")
+
+    def __init__(self, keypair: Keypair):
+        self.keypair = keypair
+        self.pubkey = str(keypair.pubkey())
+        self.in_flight = 0
+        self.sent = 0
+        self.balance: Optional[int] = None
+        self.active = True
+
+
+def _load_primary() -> Optional[Keypair]:
+    """
+    Keypair from SOLANA_PRIVATE_KEY (JSON secret key array), if set.
+    """
+    primary = os.getenv("SOLANA_PRIVATE_KEY")
+    if not primary:
+        return None
+    return Keypair.from_bytes(bytes(json.loads(primary)))
+
+
+def _load_extra() -> list[Keypair]:
+    """
+    Keypairs from SOLANA_PAYER_KEYS (JSON list of secret key arrays) or
+    SOLANA_PAYER_KEYS_FILE (file with the same JSON). Raises ValueError
+    naming the setting when it is malformed.
+    """
+    source, extra = "SOLANA_PAYER_KEYS", os.getenv("SOLANA_PAYER_KEYS")
+    path = os.getenv("SOLANA_PAYER_KEYS_FILE")
+    if not extra and path:
+        source = f"SOLANA_PAYER_KEYS_FILE ({path})"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                extra = f.read()
+        except OSError as e:
+            raise ValueError(f"Could not read {source}: {e}") from e
+    if not extra:
+        return []
+    try:
+        return [Keypair.from_bytes(bytes(key)) for key in json.loads(extra)]
+    except Exception as e:
+        raise ValueError(f"Invalid {source}: {e}") from e
+
+
+def _dedupe(keypairs: list[Keypair]) -> list[Keypair]:
+    unique, seen = [], set()
+    for kp in keypairs:
+        if kp.pubkey() not in seen:
+            seen.add(kp.pubkey())
+            unique.append(kp)
+    return unique
+
+
+class PayerPool:
+    """
+    Fee-payer keypairs handed out per transaction.
+
+    `lease()` picks a payer round-robin or by fewest in-flight transactions and
+    waits when every payer is at `max_inflight`. A background task tracks
+    balances and takes payers below `min_lamports` out of rotation.
+    """
+
+    def __init__(
+        self,
+        keypairs: list[Keypair],
+        strategy: str = SOLANA_PAYER_STRATEGY,
+        min_lamports: int = SOLANA_PAYER_MIN_LAMPORTS,
+        max_inflight: int = SOLANA_PAYER_MAX_INFLIGHT,
+    ):
+        if not keypairs:
+            raise ValueError("PayerPool needs at least one keypair")
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown SOLANA_PAYER_STRATEGY: {strategy}")
+        self.strategy = strategy
+        self.min_lamports = min_lamports
+        self.max_inflight = max_inflight
+        self._payers = [_Payer(kp) for kp in keypairs]
+        self._by_pubkey = {p.pubkey: p for p in self._payers}
+        self._next = 0
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def primary(self) -> Keypair:
+        return self._payers[0].keypair
+
+    def get(self, pubkey: str) -> Optional[Keypair]:
+        payer = self._by_pubkey.get(pubkey)
+        return payer.keypair if payer else None
+
+    def _pick(self, pubkey: Optional[str]) -> Optional[_Payer]:
+        if pubkey is not None:
+            payer = self._by_pubkey[pubkey]
+            return payer if payer.in_flight < self.max_inflight else None
+        candidates = [p for p in self._payers if p.active]
+        if not candidates:
+            raise NoPayerAvailable("All fee payers are below the minimum balance")
+        if self.strategy == "least_loaded":
+            payer = min(candidates, key=lambda p: p.in_flight)
+            return payer if payer.in_flight < self.max_inflight else None
+        for _ in range(len(candidates)):
+            payer = candidates[self._next % len(candidates)]
+            self._next += 1
+            if payer.in_flight < self.max_inflight:
+                return payer
+        return None
+
+    @asynccontextmanager
+    async def lease(self, pubkey: Optional[str] = None):
+        """
+        Reserve a payer for one transaction. With `pubkey`, wait for that
+        specific payer (e.g. when it must sign as market creator).
+        """
+        async with self._changed:
+            payer = self._pick(pubkey)
+            while payer is None:
+                await self._changed.wait()
+                payer = self._pick(pubkey)
+            payer.in_flight += 1
+        try:
+            yield payer.keypair
+            payer.sent += 1
+        finally:
+            async with self._changed:
+                payer.in_flight -= 1
+                self._changed.notify_all()
+
+    async def refresh_balances(self, client: AsyncClient):
+        responses = await asyncio.gather(
+            *(client.get_balance(p.keypair.pubkey()) for p in self._payers),
+            return_exceptions=True,
+        )
+        async with self._changed:
+            for payer, resp in zip(self._payers, responses):
+                if isinstance(resp, Exception):
+                    print(f"Warning: balance check failed for payer {payer.pubkey}: {resp}")
+                    continue
+                payer.balance = resp.value
+                was_active = payer.active
+                payer.active = payer.balance >= self.min_lamports
+                if was_active and not payer.active:
+                    print(f"Warning: payer {payer.pubkey} below minimum balance, removed from rotation")
+            self._changed.notify_all()
+
+    async def _monitor(self, client: AsyncClient, interval: float):
+        try:
+            while True:
+                try:
+                    await self.refresh_balances(client)
+                except Exception as e:
+                    print(f"Warning: payer balance refresh failed: {e}")
+                await asyncio.sleep(interval)
+        finally:
+            await client.close()
+
+    def start(self, rpc_url: str, interval: float = SOLANA_PAYER_REFRESH_SECONDS):
+        if self._task is None:
+            self._task = asyncio.create_task(self._monitor(AsyncClient(rpc_url), interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "size": len(self._payers),
+            "active": sum(1 for p in self._payers if p.active),
+            "payers": [
+                {
+                    "pubkey": p.pubkey,
+                    "active": p.active,
+                    "balance": p.balance,
+                    "in_flight": p.in_flight,
+                    "sent": p.sent,
+                }
+                for p in self._payers
+            ],
+        }
+
+
+_pool: Optional[PayerPool] = None
+
+
+def get_payer_pool() -> PayerPool:
+    """
+    Process-wide payer pool. Falls back to a random keypair for testing when
+    no keys are configured, matching the orchestrator's previous behaviour.
+    """
+    global _pool
+    if _pool is None:
+        try:
+            primary = _load_primary()
+        except Exception as e:
+            print(f"Warning: Could not load SOLANA_PRIVATE_KEY: {e}")
+            primary = None
+        # Extra payers are opt-in, so a malformed setting fails startup
+        # rather than silently shrinking the pool
+        keypairs = _dedupe(([primary] if primary else []) + _load_extra())
+        if not keypairs:
+            print("Warning: No SOLANA_PRIVATE_KEY in .env, using random keypair")
+            keypairs = [Keypair()]
+        _pool = PayerPool(keypairs)
+    return _pool
@@ -0,0 +1,81 @@
+import os
+import random
+import time
+from typing import Optional
+
+from market_state import MarketAccount, PositionAccount
+
+# Share of locally rejected writes still simulated on-chain to detect cache drift
+PREVALIDATION_SIMULATE_FRACTION = float(os.getenv("PREVALIDATION_SIMULATE_FRACTION", "0.02"))
+# Only treat a market as expired this long after end_time (chain clock lags wall clock)
+PREVALIDATION_CLOCK_SKEW_SECONDS = int(os.getenv("PREVALIDATION_CLOCK_SKEW_SECONDS", "5"))
+
+# Program errors (idl/bizfi_market.json) that can be predicted from cached state
+ERRORS = {
+    "MarketNotActive": (6000, "Market is not currently active"),
+    "MarketExpired": (6004, "Market has expired"),
+    "InvalidAmount": (6005, "Invalid amount"),
+    "MarketNotResolved": (6007, "Market not resolved yet"),
+    "AlreadyClaimed": (6008, "Already claimed"),
+    "NoWinnings": (6009, "No winnings to claim"),
+}
+
+# Errors decided by the request alone; cache drift can't cause them, so they are never simulated
+_STATELESS = {"InvalidAmount"}
+_U64_MAX = 2 ** 64 - 1
+
+stats = {"checked": 0, "rejected": 0, "simulated": 0, "drift": 0}
+
+
+def check_bet(market: Optional[MarketAccount], amount: int, now: Optional[float] = None) -> Optional[str]:
+    """
+    Name of the program error place_bet would fail with, or None.
+    Unknown markets pass through to the chain.
+    """
+    stats["checked"] += 1
+    if amount <= 0 or amount > _U64_MAX:
+        return "InvalidAmount"
+    if market is None:
+        return None
+    if market.status != "Active":
+        return "MarketNotActive"
+    now = time.time() if now is None else now
+    if now >= market.end_time + PREVALIDATION_CLOCK_SKEW_SECONDS:
+        return "MarketExpired"
+    return None
+
+
+def check_claim(market: Optional[MarketAccount], position: Optional[PositionAccount]) -> Optional[str]:
+    """
+    Name of the program error claim_winnings would fail with, or None.
+    """
+    stats["checked"] += 1
+    if market is None:
+        return None
+    if market.status != "Resolved":
+        return "MarketNotResolved"
+    if position is None:
+        return None
+    if position.claimed:
+        return "AlreadyClaimed"
+    stake = position.yes_amount if market.outcome else position.no_amount
+    winning_pool = market.yes_pool if market.outcome else market.no_pool
+    if stake == 0 or winning_pool == 0:
+        return "NoWinnings"
+    return None
+
+
+def should_simulate(name: str) -> bool:
+    """
+    Whether a local rejection should still be checked on-chain. Only
+    rejections that depend on cached state are sampled.
+    """
+    if name in _STATELESS:
+        return False
+    return random.random() < PREVALIDATION_SIMULATE_FRACTION
+
+
+def rejection(name: str) -> dict:
+    code, msg = ERRORS[name]
+    stats["rejected"] += 1
+    return {"error": msg, "code": code, "name": name, "prevalidated": True}
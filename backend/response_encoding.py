@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Request, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.bizfi.columnar+json"
+MSGPACK = "application/msgpack"
+_FORMATS = {"json": JSON, "columnar": COLUMNAR_JSON, "msgpack": MSGPACK}
+
+
+def dumps_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def negotiate_format(request: Request) -> str:
+    """
+    Pick the body format from ?format= or the Accept header.
+    """
+    fmt = request.query_params.get("format")
+    if fmt:
+        if fmt not in _FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+        media_type = _FORMATS[fmt]
+    else:
+        accept = request.headers.get("accept", "")
+        if MSGPACK in accept or "application/x-msgpack" in accept:
+            media_type = MSGPACK
+        elif COLUMNAR_JSON in accept:
+            media_type = COLUMNAR_JSON
+        else:
+            media_type = JSON
+    if media_type == MSGPACK and msgpack is None:
+        raise HTTPException(status_code=406, detail="msgpack encoding is not available")
+    return media_type
+
+
+def negotiate_compression(request: Request) -> Optional[str]:
+    accept = request.headers.get("accept-encoding", "")
+    codings = {part.split(";")[0].strip() for part in accept.split(",")}
+    if "br" in codings and brotli is not None:
+        return "br"
+    if "gzip" in codings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, coding: Optional[str]) -> tuple[bytes, Optional[str]]:
+    if coding is None or len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+        return body, None
+    if coding == "br":
+        return brotli.compress(body, quality=4), "br"
+    return gzip.compress(body, compresslevel=5), "gzip"
+
+
+def encode_rows(
+    media_type: str,
+    fields: Sequence[str],
+    rows: Sequence[tuple],
+    key: Optional[str] = None,
+    meta: Optional[dict] = None,
+) -> bytes:
+    """
+    Serialize tuples without building per-row models.
+
+    JSON keeps the existing shape: a list of objects, either the whole body or
+    under `key` next to `meta`. Columnar JSON and msgpack send one array per
+    field ({"count": n, "fields": [...], "columns": {field: [...]}}), which
+    drops the repeated field names.
+    """
+    if media_type == JSON:
+        items = [dict(zip(fields, row)) for row in rows]
+        value = items if key is None else {**(meta or {}), key: items}
+    else:
+        columns = {f: list(col) for f, col in zip(fields, zip(*rows))} if rows else {f: [] for f in fields}
+        table = {"count": len(rows), "fields": list(fields), "columns": columns}
+        value = table if key is None else {**(meta or {}), key: table}
+    if media_type == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    return dumps_json(value)
+
+
+def encode_value(media_type: str, value) -> bytes:
+    """
+    Serialize a non-tabular payload; columnar requests get plain JSON.
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    return dumps_json(value)
+
+
+def negotiate(request: Request) -> tuple[str, Optional[str]]:
+    return negotiate_format(request), negotiate_compression(request)
+
+
+def finish(body: bytes, coding: Optional[str]) -> tuple[bytes, dict]:
+    """
+    Compress if worthwhile and return the body with its representation headers.
+    """
+    body, coding = compress(body, coding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if coding:
+        headers["Content-Encoding"] = coding
+    return body, headers
+
+
+def rows_response(
+    request: Request,
+    fields: Sequence[str],
+    rows: Sequence[tuple],
+    key: Optional[str] = None,
+    meta: Optional[dict] = None,
+) -> Response:
+    """
+    Negotiated, optionally compressed response for a bulk endpoint.
+    """
+    media_type, coding = negotiate(request)
+    body, headers = finish(encode_rows(media_type, fields, rows, key, meta), coding)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,17 +1,32 @@
 import os
-import json
 import asyncio
+from typing import Optional
 from solana.rpc.async_api import AsyncClient
-from solana.rpc.types import TxOpts
+from solana.rpc.commitment import Confirmed
+from solana.rpc.core import RPCException, TransactionExpiredBlockheightExceededError
+from solana.rpc.types import DataSliceOpts, TxOpts
 from solders.system_program import ID as SYS_PROGRAM_ID
 from solders.pubkey import Pubkey as _Pubkey
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
+from solders.instruction import Instruction
+from solders.message import Message
+from solders.signature import Signature
+from solders.transaction import Transaction
 from dotenv import load_dotenv
-from anchorpy import Context, Idl, Program, Provider, Wallet
+from idempotency import OutcomeUnknown
+from idl_codec import InstructionBuilder, load_instructions
+from market_state import store as market_state
+from payer_pool import get_payer_pool
+import prevalidation
+from tracing import TracedClient, span, traced
 
 load_dotenv()
 
+PROGRAM_ACCOUNT_FIELDS = ("pubkey", "lamports", "owner")
+# Resolve instructions packed into one transaction by resolve_markets
+RESOLVE_BATCH_SIZE = int(os.getenv("RESOLVE_BATCH_SIZE", "8"))
+
 class BizMartOrchestrator:
     """
     Handles Solana blockchain interactions for BizFi markets
@@ -19,54 +34,96 @@ class BizMartOrchestrator:
     
     def __init__(self):
         self.rpc_url = os.getenv("SOLANA_RPC_URL", "https://api.devnet.solana.com")
-        self.client = AsyncClient(self.rpc_url)
+        # Raw RPC calls show up as "rpc.<method>" spans in traced requests
+        self.client = TracedClient(AsyncClient(self.rpc_url))
         self.program_id_str = os.getenv("SOLANA_PROGRAM_ID")
         self.program_id = None
         self.idl_path = os.getenv(
             "IDL_PATH",
             os.path.join(os.path.dirname(__file__), "idl", "bizfi_market.json")
         )
-        self._program = None
+        self._builder: Optional[InstructionBuilder] = None
         if self.program_id_str:
             try:
                 self.program_id = Pubkey.from_string(self.program_id_str)
             except Exception as e:
                 print(f"Warning: Invalid SOLANA_PROGRAM_ID: {e}")
         
-        # Load keypair from environment
-        key_str = os.getenv("SOLANA_PRIVATE_KEY")
-        if key_str:
-            try:
-                key_bytes = bytes(json.loads(key_str))
-                self.payer = Keypair.from_bytes(key_bytes)
-            except Exception as e:
-                print(f"Warning: Could not load keypair from env: {e}")
-                self.payer = Keypair()  # Fallback to random for testing
-        else:
-            print("Warning: No SOLANA_PRIVATE_KEY in .env, using random keypair")
-            self.payer = Keypair()
+        # Fee payers are shared process-wide; self.payer is the primary key
+        # from SOLANA_PRIVATE_KEY.
+        self.payer_pool = get_payer_pool()
+        self.payer = self.payer_pool.primary
 
         # SPL Token Program (official)
         self.token_program_id = _Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
 
-    async def _get_program(self) -> Program:
-        if self._program:
-            return self._program
+    def _get_builder(self) -> InstructionBuilder:
+        if self._builder:
+            return self._builder
         if not self.program_id:
             raise ValueError("SOLANA_PROGRAM_ID not set or invalid")
         if not os.path.exists(self.idl_path):
             raise FileNotFoundError(f"IDL not found at {self.idl_path}")
-
-        with open(self.idl_path, "r", encoding="utf-8") as f:
-            idl = Idl.from_json(f.read())
-
-        provider = Provider(self.client, Wallet(self.payer), opts=TxOpts(preflight_commitment="confirmed"))
-        self._program = Program(idl, self.program_id, provider)
-        return self._program
+        self._builder = InstructionBuilder(self.program_id, load_instructions(self.idl_path))
+        return self._builder
 
     def _pubkey(self, value: str) -> Pubkey:
         return Pubkey.from_string(value)
 
+    def _instruction(self, name: str, *args, accounts: dict) -> Instruction:
+        with span("ix.build", name=name):
+            return self._get_builder().build(name, args, accounts)
+
+    async def _build_tx(self, ix: Instruction | list[Instruction], payer: Keypair, signers: list[Keypair]):
+        latest = (await self.client.get_latest_blockhash(Confirmed)).value
+        ixs = ix if isinstance(ix, list) else [ix]
+        message = Message.new_with_blockhash(ixs, payer.pubkey(), latest.blockhash)
+        return Transaction([payer, *signers], message, latest.blockhash), latest
+
+    async def _send(self, ix: Instruction | list[Instruction], payer: Keypair, signers: list[Keypair]) -> str:
+        """
+        Sign with `payer` as fee payer plus `signers`, send and confirm.
+        Raises OutcomeUnknown when the transaction may have landed: the send
+        failed in transit or confirmation failed before the blockhash expired.
+        """
+        with span("tx.sign", signers=1 + len(signers)):
+            tx, latest = await self._build_tx(ix, payer, signers)
+        signature = tx.signatures[0]
+        try:
+            await self.client.send_raw_transaction(
+                bytes(tx),
+                opts=TxOpts(skip_confirmation=True, preflight_commitment=Confirmed),
+            )
+        except RPCException:
+            # The node answered with an error (e.g. preflight): nothing was sent
+            raise
+        except Exception as e:
+            raise OutcomeUnknown(f"Transaction {signature} may have been sent: {e}", str(signature)) from e
+        try:
+            await self.client.confirm_transaction(
+                signature, Confirmed, last_valid_block_height=latest.last_valid_block_height
+            )
+        except TransactionExpiredBlockheightExceededError:
+            # Blockhash expired unconfirmed: the transaction can no longer land
+            raise
+        except Exception as e:
+            raise OutcomeUnknown(f"Transaction {signature} was sent but not confirmed: {e}", str(signature)) from e
+        return str(signature)
+
+    async def _simulates_ok(self, ix: Instruction, payer: Keypair, rejected: str) -> bool:
+        """
+        Check a locally rejected instruction against the chain. True means the
+        cached state had drifted and the transaction should be sent after all.
+        """
+        prevalidation.stats["simulated"] += 1
+        tx, _ = await self._build_tx(ix, payer, [])
+        resp = await self.client.simulate_transaction(tx, commitment=Confirmed)
+        if resp.value.err is not None:
+            return False
+        prevalidation.stats["drift"] += 1
+        print(f"Warning: cached state predicted {rejected} but simulation succeeded")
+        return True
+
     async def check_fee_payment(self, user_wallet: str) -> bool:
         """
         Check if the user has sent 10 USDC to the BizFi treasury.
@@ -186,6 +243,7 @@ class BizMartOrchestrator:
             "end_time": 1234567890
         }
 
+    @traced("orchestrator.get_program_status")
     async def get_program_status(self) -> dict:
         """
         Verify program account exists and basic metadata.
@@ -206,19 +264,103 @@ class BizMartOrchestrator:
             "lamports": value.lamports,
         }
 
+    @traced("orchestrator.get_program_account_rows")
+    async def get_program_account_rows(self) -> tuple[dict, list[tuple]]:
+        """
+        Program-owned accounts as (pubkey, lamports, owner) rows plus response metadata.
+        Account data is sliced away since only the listing is returned.
+        """
+        if not self.program_id:
+            return {"program_id": self.program_id_str, "error": "SOLANA_PROGRAM_ID not set or invalid"}, []
+
+        resp = await self.client.get_program_accounts(
+            self.program_id, data_slice=DataSliceOpts(offset=0, length=0)
+        )
+        rows = [(str(a.pubkey), a.account.lamports, str(a.account.owner)) for a in resp.value]
+        return {"program_id": str(self.program_id)}, rows
+
     async def get_program_accounts(self) -> dict:
         """
         Fetch program-owned accounts (read-only).
         """
+        meta, rows = await self.get_program_account_rows()
+        return {**meta, "accounts": [dict(zip(PROGRAM_ACCOUNT_FIELDS, row)) for row in rows]}
+
+    @traced("orchestrator.fetch_program_account_data")
+    async def fetch_program_account_data(self) -> tuple[list[tuple[str, bytes]], int]:
+        """
+        Fetch raw data of all program-owned accounts plus the slot the scan started at.
+        """
         if not self.program_id:
-            return {"program_id": self.program_id_str, "accounts": [], "error": "SOLANA_PROGRAM_ID not set or invalid"}
+            raise ValueError("SOLANA_PROGRAM_ID not set or invalid")
+        slot = (await self.client.get_slot()).value
+        resp = await self.client.get_program_accounts(self.program_id, encoding="base64")
+        return [(str(a.pubkey), bytes(a.account.data)) for a in resp.value], slot
 
-        resp = await self.client.get_program_accounts(self.program_id)
-        accounts = [
-            {"pubkey": str(a.pubkey), "lamports": a.account.lamports, "owner": str(a.account.owner)}
-            for a in resp.value
-        ]
-        return {"program_id": str(self.program_id), "accounts": accounts}
+    async def get_latest_program_signature(self) -> Optional[str]:
+        if not self.program_id:
+            raise ValueError("SOLANA_PROGRAM_ID not set or invalid")
+        resp = await self.client.get_signatures_for_address(self.program_id, limit=1)
+        return str(resp.value[0].signature) if resp.value else None
+
+    async def fetch_accounts_changed_since(
+        self, signature: str, max_signatures: int
+    ) -> Optional[tuple[list[tuple[str, Optional[bytes]]], int, str]]:
+        """
+        Current data of every account referenced by program transactions newer
+        than `signature`, as (pubkey, data or None if closed) for accounts the
+        program owns or that no longer exist, plus the slot and the newest
+        signature. None if there are more than `max_signatures` transactions.
+        """
+        if not self.program_id:
+            raise ValueError("SOLANA_PROGRAM_ID not set or invalid")
+        until = Signature.from_string(signature)
+        newer = []
+        before = None
+        while True:
+            page = (await self.client.get_signatures_for_address(
+                self.program_id, before=before, until=until, limit=1000
+            )).value
+            newer.extend(page)
+            if len(newer) > max_signatures:
+                return None
+            if len(page) < 1000:
+                break
+            before = page[-1].signature
+        if not newer:
+            return [], (await self.client.get_slot()).value, signature
+
+        semaphore = asyncio.Semaphore(8)
+
+        async def touched(sig: Signature) -> list[Pubkey]:
+            async with semaphore:
+                resp = await self.client.get_transaction(
+                    sig, encoding="base64", max_supported_transaction_version=0
+                )
+            if resp.value is None:
+                return []
+            keys = list(resp.value.transaction.transaction.message.account_keys)
+            meta = resp.value.transaction.meta
+            if meta is not None and meta.loaded_addresses is not None:
+                keys += meta.loaded_addresses.writable
+            return keys
+
+        keys = set()
+        for found in await asyncio.gather(*(touched(s.signature) for s in newer if s.err is None)):
+            keys.update(found)
+        keys = list(keys)
+        accounts = []
+        slot = None
+        for i in range(0, len(keys), 100):
+            chunk = keys[i:i + 100]
+            resp = await self.client.get_multiple_accounts(chunk, encoding="base64")
+            slot = resp.context.slot if slot is None else min(slot, resp.context.slot)
+            for pubkey, account in zip(chunk, resp.value):
+                if account is None:
+                    accounts.append((str(pubkey), None))
+                elif account.owner == self.program_id:
+                    accounts.append((str(pubkey), bytes(account.data)))
+        return accounts, slot or 0, str(newer[0].signature)
 
     def derive_market_pda(self, market_id: str) -> dict:
         """
@@ -251,40 +393,87 @@ class BizMartOrchestrator:
         pda, bump = Pubkey.find_program_address(seeds, self.program_id)
         return {"pda": str(pda), "bump": bump}
 
+    @traced("orchestrator.initialize_market")
     async def initialize_market(self, question: str, duration: int) -> dict:
         """
         Initialize a new market using the on-chain program.
+        The leased payer pays fees and becomes the market creator.
         """
-        program = await self._get_program()
         market_kp = Keypair()
-        ctx = Context(
-            accounts={
+        async with self.payer_pool.lease() as payer:
+            accounts = {
                 "market": market_kp.pubkey(),
-                "creator": self.payer.pubkey(),
+                "creator": payer.pubkey(),
                 "system_program": SYS_PROGRAM_ID,
-            },
-            signers=[self.payer, market_kp],
-        )
+            }
+            ix = self._instruction("initialize_market", question, duration, accounts=accounts)
+            sig = await self._send(ix, payer, [market_kp])
+        return {"signature": sig, "market_pubkey": str(market_kp.pubkey()), "creator": str(payer.pubkey())}
 
-        rpc = program.rpc
-        method = rpc["initialize_market"] if "initialize_market" in rpc else rpc["initializeMarket"]
-        sig = await method(question, duration, ctx=ctx)
-        return {"signature": str(sig), "market_pubkey": str(market_kp.pubkey())}
+    def _resolve_authority(self, market_pubkey: str) -> str:
+        # The program requires the creator to sign; use its key when we hold it.
+        market = market_state.markets.get(market_pubkey)
+        return market.creator if market and self.payer_pool.get(market.creator) else str(self.payer.pubkey())
 
+    @traced("orchestrator.resolve_market")
     async def resolve_market(self, market_pubkey: str, outcome: bool) -> dict:
-        program = await self._get_program()
-        ctx = Context(
-            accounts={
+        async with self.payer_pool.lease(self._resolve_authority(market_pubkey)) as payer:
+            accounts = {
                 "market": self._pubkey(market_pubkey),
-                "authority": self.payer.pubkey(),
-            },
-            signers=[self.payer],
-        )
-        rpc = program.rpc
-        method = rpc["resolve_market"] if "resolve_market" in rpc else rpc["resolveMarket"]
-        sig = await method(outcome, ctx=ctx)
-        return {"signature": str(sig), "market_pubkey": market_pubkey}
-
+                "authority": payer.pubkey(),
+            }
+            ix = self._instruction("resolve_market", outcome, accounts=accounts)
+            sig = await self._send(ix, payer, [])
+        return {"signature": sig, "market_pubkey": market_pubkey}
+
+    @traced("orchestrator.resolve_markets")
+    async def resolve_markets(self, markets: list[dict]) -> dict:
+        """
+        Resolve several markets ({"market_pubkey", "outcome"} each). Markets
+        sharing a creator key go into one transaction of up to
+        RESOLVE_BATCH_SIZE instructions; a failed batch is retried market by market.
+        """
+        by_authority: dict[str, list[dict]] = {}
+        for item in markets:
+            by_authority.setdefault(self._resolve_authority(item["market_pubkey"]), []).append(item)
+        results: dict[str, dict] = {}
+        for authority, items in by_authority.items():
+            for i in range(0, len(items), RESOLVE_BATCH_SIZE):
+                chunk = items[i:i + RESOLVE_BATCH_SIZE]
+                try:
+                    async with self.payer_pool.lease(authority) as payer:
+                        ixs = [
+                            self._instruction(
+                                "resolve_market",
+                                item["outcome"],
+                                accounts={"market": self._pubkey(item["market_pubkey"]), "authority": payer.pubkey()},
+                            )
+                            for item in chunk
+                        ]
+                        sig = await self._send(ixs, payer, [])
+                    for item in chunk:
+                        results[item["market_pubkey"]] = {"signature": sig}
+                    continue
+                except OutcomeUnknown as e:
+                    # May have landed: retrying singly could resolve twice
+                    for item in chunk:
+                        results[item["market_pubkey"]] = {"error": str(e), "signature": e.signature}
+                    continue
+                except Exception as e:
+                    if len(chunk) > 1:
+                        print(f"Warning: batched resolve of {len(chunk)} markets failed, retrying singly: {e}")
+                    else:
+                        results[chunk[0]["market_pubkey"]] = {"error": str(e)}
+                        continue
+                for item in chunk:
+                    try:
+                        results[item["market_pubkey"]] = await self.resolve_market(item["market_pubkey"], item["outcome"])
+                    except Exception as e:
+                        results[item["market_pubkey"]] = {"error": str(e)}
+        failed = [pubkey for pubkey, result in results.items() if "error" in result]
+        return {"resolved": len(results) - len(failed), "failed": failed, "results": results}
+
+    @traced("orchestrator.place_bet")
     async def place_bet(
         self,
         market_pubkey: str,
@@ -296,28 +485,32 @@ class BizMartOrchestrator:
         bet_on_yes: bool,
     ) -> dict:
         """
-        Place a bet. For now this only supports server signing when user_pubkey is the payer.
+        Place a bet. For now this only supports server signing when user_pubkey is one of the payers.
         """
-        if str(self.payer.pubkey()) != user_pubkey:
+        user = self.payer_pool.get(user_pubkey)
+        if user is None:
             return {"error": "Backend can only sign for payer. Use client-side signing for user bets."}
-        program = await self._get_program()
-        ctx = Context(
-            accounts={
-                "market": self._pubkey(market_pubkey),
-                "user": self.payer.pubkey(),
-                "user_usdc": self._pubkey(user_usdc),
-                "vault_usdc": self._pubkey(vault_usdc),
-                "user_position": self._pubkey(user_position),
-                "token_program": self.token_program_id,
-                "system_program": SYS_PROGRAM_ID,
-            },
-            signers=[self.payer],
-        )
-        rpc = program.rpc
-        method = rpc["place_bet"] if "place_bet" in rpc else rpc["placeBet"]
-        sig = await method(amount, bet_on_yes, ctx=ctx)
-        return {"signature": str(sig), "market_pubkey": market_pubkey}
-
+        # Reject doomed bets from cached state before building or sending anything
+        rejected = prevalidation.check_bet(market_state.markets.get(market_pubkey), amount)
+        if rejected and not prevalidation.should_simulate(rejected):
+            return prevalidation.rejection(rejected)
+        accounts = {
+            "market": self._pubkey(market_pubkey),
+            "user": user.pubkey(),
+            "user_usdc": self._pubkey(user_usdc),
+            "vault_usdc": self._pubkey(vault_usdc),
+            "user_position": self._pubkey(user_position),
+            "token_program": self.token_program_id,
+            "system_program": SYS_PROGRAM_ID,
+        }
+        ix = self._instruction("place_bet", amount, bet_on_yes, accounts=accounts)
+        if rejected and not await self._simulates_ok(ix, user, rejected):
+            return prevalidation.rejection(rejected)
+        async with self.payer_pool.lease(user_pubkey) as payer:
+            sig = await self._send(ix, payer, [])
+        return {"signature": sig, "market_pubkey": market_pubkey}
+
+    @traced("orchestrator.claim_winnings")
     async def claim_winnings(
         self,
         market_pubkey: str,
@@ -327,26 +520,31 @@ class BizMartOrchestrator:
         user_position: str,
     ) -> dict:
         """
-        Claim winnings. Only supports server signing when user_pubkey is the payer.
+        Claim winnings. Only supports server signing when user_pubkey is one of the payers.
         """
-        if str(self.payer.pubkey()) != user_pubkey:
+        user = self.payer_pool.get(user_pubkey)
+        if user is None:
             return {"error": "Backend can only sign for payer. Use client-side signing for user claims."}
-        program = await self._get_program()
-        ctx = Context(
-            accounts={
-                "market": self._pubkey(market_pubkey),
-                "user": self.payer.pubkey(),
-                "user_usdc": self._pubkey(user_usdc),
-                "vault_usdc": self._pubkey(vault_usdc),
-                "user_position": self._pubkey(user_position),
-                "token_program": self.token_program_id,
-            },
-            signers=[self.payer],
+        rejected = prevalidation.check_claim(
+            market_state.markets.get(market_pubkey),
+            market_state.positions.get(user_position),
         )
-        rpc = program.rpc
-        method = rpc["claim_winnings"] if "claim_winnings" in rpc else rpc["claimWinnings"]
-        sig = await method(ctx=ctx)
-        return {"signature": str(sig), "market_pubkey": market_pubkey}
+        if rejected and not prevalidation.should_simulate(rejected):
+            return prevalidation.rejection(rejected)
+        accounts = {
+            "market": self._pubkey(market_pubkey),
+            "user": user.pubkey(),
+            "user_usdc": self._pubkey(user_usdc),
+            "vault_usdc": self._pubkey(vault_usdc),
+            "user_position": self._pubkey(user_position),
+            "token_program": self.token_program_id,
+        }
+        ix = self._instruction("claim_winnings", accounts=accounts)
+        if rejected and not await self._simulates_ok(ix, user, rejected):
+            return prevalidation.rejection(rejected)
+        async with self.payer_pool.lease(user_pubkey) as payer:
+            sig = await self._send(ix, payer, [])
+        return {"signature": sig, "market_pubkey": market_pubkey}
 
     async def close(self):
         """Close the RPC client connection"""
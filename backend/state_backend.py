@@ -0,0 +1,307 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+from urllib.parse import urlparse
+
+# memory: single process only. sqlite: shared by all workers on one host.
+# redis: shared across hosts (any server speaking the Redis protocol).
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(os.path.dirname(__file__), "state.db"))
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+# Expired keys and idle rate-limit entries are dropped at most this often
+STATE_SWEEP_INTERVAL_SECONDS = 60
+
+
+class StateBackend(ABC):
+    """
+    Key/value and rate-limit state that can live outside the worker process.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """
+        Set `key` only if it is absent or expired. Returns True if it was set.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def hit(self, key: str, window: float, limit: int) -> bool:
+        """
+        Count one request against `key`. Returns False once `limit` requests
+        were seen within `window` seconds.
+        """
+
+    async def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    def __init__(self):
+        self._values: dict[str, tuple[bytes, Optional[float]]] = {}
+        self._requests: dict[str, deque[float]] = defaultdict(deque)
+        self._max_window = 0.0
+        self._last_sweep = time.time()
+
+    def _sweep(self, now: float):
+        if now - self._last_sweep < STATE_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        for key in [k for k, (_, expires) in self._values.items() if expires is not None and expires <= now]:
+            del self._values[key]
+        # Keys with no request inside any window in use can no longer limit anything
+        for key in [k for k, q in self._requests.items() if not q or now - q[-1] > self._max_window]:
+            del self._requests[key]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        now = time.time()
+        self._sweep(now)
+        self._values[key] = (value, now + ttl if ttl else None)
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def hit(self, key: str, window: float, limit: int) -> bool:
+        now = time.time()
+        self._max_window = max(self._max_window, window)
+        self._sweep(now)
+        q = self._requests[key]
+        # drop old entries
+        while q and now - q[0] > window:
+            q.popleft()
+        if len(q) >= limit:
+            return False
+        q.append(now)
+        return True
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    SQLite in WAL mode, so `uvicorn --workers N` on one host shares state.
+    Rate limits use fixed windows keyed by window start.
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hits (key TEXT PRIMARY KEY, count INTEGER, expires REAL)"
+        )
+        self._last_sweep = 0.0
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def _run(self, sql: str, params: tuple = ()) -> list:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        rows = await self._run(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        )
+        return rows[0][0] if rows else None
+
+    async def _sweep(self, now: float):
+        if now - self._last_sweep < STATE_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        await self._run("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        now = time.time()
+        await self._sweep(now)
+        await self._run(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl else None),
+        )
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        await self._sweep(now)
+        # An expired row is overwritten; a live one makes the upsert a no-op
+        rows = await self._run(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE kv.expires IS NOT NULL AND kv.expires <= ? RETURNING key",
+            (key, value, now + ttl if ttl else None, now),
+        )
+        return bool(rows)
+
+    async def delete(self, key: str):
+        await self._run("DELETE FROM kv WHERE key = ?", (key,))
+
+    async def hit(self, key: str, window: float, limit: int) -> bool:
+        now = time.time()
+        bucket = f"{key}:{int(now // window)}"
+        rows = await self._run(
+            "INSERT INTO hits (key, count, expires) VALUES (?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET count = count + 1 RETURNING count",
+            (bucket, now + window),
+        )
+        if rows[0][0] == 1:
+            # first hit of a new window: sweep expired buckets
+            await self._run("DELETE FROM hits WHERE expires < ?", (now,))
+        return rows[0][0] <= limit
+
+    async def close(self):
+        self._conn.close()
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Minimal RESP2 client (GET/SET [NX]/DEL/INCR/PEXPIRE) over a small connection pool.
+    """
+
+    def __init__(self, url: str = STATE_REDIS_URL, pool_size: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self._pool: asyncio.Queue = asyncio.Queue()
+        self._pool_size = pool_size
+        self._opened = 0
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    @staticmethod
+    async def _read_reply(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {payload.decode()}")
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [await RedisStateBackend._read_reply(reader) for _ in range(int(payload))]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(self._encode(*command))
+            await writer.drain()
+            await self._read_reply(reader)
+        return reader, writer
+
+    async def _pipeline(self, *commands: tuple) -> list:
+        if self._pool.empty() and self._opened < self._pool_size:
+            self._opened += 1
+            try:
+                conn = await self._connect()
+            except BaseException:
+                self._opened -= 1
+                raise
+        else:
+            conn = await self._pool.get()
+        reader, writer = conn
+        try:
+            writer.write(b"".join(self._encode(*c) for c in commands))
+            await writer.drain()
+            replies = [await self._read_reply(reader) for _ in commands]
+        except BaseException:
+            # Includes cancellation: the reply stream is out of sync, so the
+            # connection can't go back to the pool but its slot must be freed
+            writer.close()
+            self._opened -= 1
+            raise
+        self._pool.put_nowait(conn)
+        return replies
+
+    async def get(self, key: str) -> Optional[bytes]:
+        (value,) = await self._pipeline(("GET", key))
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            await self._pipeline(("SET", key, value, "PX", int(ttl * 1000)))
+        else:
+            await self._pipeline(("SET", key, value))
+
+    async def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if ttl:
+            (reply,) = await self._pipeline(("SET", key, value, "NX", "PX", int(ttl * 1000)))
+        else:
+            (reply,) = await self._pipeline(("SET", key, value, "NX"))
+        return reply is not None
+
+    async def delete(self, key: str):
+        await self._pipeline(("DEL", key))
+
+    async def hit(self, key: str, window: float, limit: int) -> bool:
+        bucket = f"{key}:{int(time.time() // window)}"
+        count, _ = await self._pipeline(("INCR", bucket), ("PEXPIRE", bucket, int(window * 1000)))
+        return count <= limit
+
+    async def close(self):
+        while not self._pool.empty():
+            _, writer = self._pool.get_nowait()
+            writer.close()
+        self._opened = 0
+
+
+def create_state_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend()
+    if kind == "redis":
+        return RedisStateBackend()
+    raise ValueError(f"Unknown STATE_BACKEND: {kind}")
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import struct
+import tempfile
+import zlib
+from typing import Optional
+
+from market_state import MARKET_STATUSES, MarketAccount, MarketStateStore, PositionAccount
+
+STATE_SNAPSHOT_PATH = os.getenv(
+    "STATE_SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "state_snapshot.bin")
+)
+STATE_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("STATE_SNAPSHOT_INTERVAL_SECONDS", "60"))
+
+MAGIC = b"BZSTATE\x00"
+FORMAT_VERSION = 2
+# Program limit (QuestionTooLong); longer questions are left to the next sync
+MAX_QUESTION_BYTES = 256
+
+# Fixed-width records; pubkeys are base58 text NUL-padded to 44 bytes so
+# loading needs no base58 conversion. Every record ends with the account's
+# data digest so the next sync skips accounts that have not changed. The
+# header ends with a CRC32 of the records.
+_HEADER = struct.Struct("<8sH44sQ88sIII")
+_MARKET = struct.Struct(f"<44s44sH{MAX_QUESTION_BYTES}sqBQQQ?16s")
+_POSITION = struct.Struct("<44s44s44sQQ?16s")
+_STATUS_INDEX = {status: i for i, status in enumerate(MARKET_STATUSES)}
+
+
+def _key(raw: bytes) -> str:
+    return raw.rstrip(b"\x00").decode("ascii")
+
+
+class _Keys(dict):
+    """
+    Decoded pubkeys by raw field; creators, users and markets repeat across
+    records, so each is decoded once and the strings are shared.
+    """
+
+    def __missing__(self, raw: bytes) -> str:
+        key = self[raw] = _key(raw)
+        return key
+
+
+def _pack(program_id: str, slot: int, signature: Optional[str], markets: list, positions: list, digests: dict) -> bytes:
+    market_records = []
+    for m in markets:
+        question = m.question.encode("utf-8")
+        if len(question) > MAX_QUESTION_BYTES:
+            continue
+        market_records.append(_MARKET.pack(
+            m.pubkey.encode(), m.creator.encode(), len(question), question, m.end_time,
+            _STATUS_INDEX[m.status], m.total_pool, m.yes_pool, m.no_pool, m.outcome, digests[m.pubkey],
+        ))
+    position_records = [
+        _POSITION.pack(
+            p.pubkey.encode(), p.user.encode(), p.market.encode(),
+            p.yes_amount, p.no_amount, p.claimed, digests[p.pubkey],
+        )
+        for p in positions
+    ]
+    body = b"".join(market_records) + b"".join(position_records)
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, program_id.encode(), slot, (signature or "").encode(),
+        len(market_records), len(position_records), zlib.crc32(body),
+    )
+    return header + body
+
+
+def _write_file(path: str, body: bytes):
+    # A unique temp file per write: workers snapshotting at the same time
+    # must not truncate each other's file before it is renamed into place
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+async def write_snapshot(store: MarketStateStore, program_id: str, path: str = STATE_SNAPSHOT_PATH):
+    """
+    Write the store atomically (temp file + rename). Accounts are captured on
+    the event loop; packing and I/O run in a worker thread.
+    """
+    markets = list(store.markets.values())
+    positions = list(store.positions.values())
+    digests = store.digests()
+    slot, signature = store.slot, store.signature
+    await asyncio.to_thread(lambda: _write_file(path, _pack(program_id, slot, signature, markets, positions, digests)))
+
+
+def load_snapshot(store: MarketStateStore, program_id: str, path: str = STATE_SNAPSHOT_PATH) -> bool:
+    """
+    Read a snapshot of `program_id` and load it into the store.
+    Returns False when there is no usable snapshot.
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        view = memoryview(data)
+        magic, version, program, slot, signature, n_markets, n_positions, crc = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            print(f"Warning: ignoring state snapshot {path} with unknown format")
+            return False
+        if _key(program) != program_id:
+            print(f"Warning: ignoring state snapshot {path} of another program")
+            return False
+        offset = _HEADER.size
+        market_end = offset + n_markets * _MARKET.size
+        position_end = market_end + n_positions * _POSITION.size
+        if len(view) != position_end:
+            print(f"Warning: ignoring truncated state snapshot {path}")
+            return False
+        if zlib.crc32(view[offset:]) != crc:
+            print(f"Warning: ignoring corrupt state snapshot {path}")
+            return False
+        markets, positions, digests = {}, {}, {}
+        keys = _Keys()
+        for (pubkey, creator, qlen, question, end_time, status,
+             total, yes, no, outcome, digest) in _MARKET.iter_unpack(view[offset:market_end]):
+            key = keys[pubkey]
+            markets[key] = MarketAccount(
+                key, keys[creator], question[:qlen].decode("utf-8"), end_time,
+                MARKET_STATUSES[status], total, yes, no, outcome,
+            )
+            digests[key] = digest
+        for (pubkey, user, market, yes, no, claimed, digest) in _POSITION.iter_unpack(
+            view[market_end:position_end]
+        ):
+            key = _key(pubkey)
+            positions[key] = PositionAccount(key, keys[user], keys[market], yes, no, claimed)
+            digests[key] = digest
+    except Exception as e:
+        print(f"Warning: could not load state snapshot {path}: {e}")
+        return False
+    store.load(markets, positions, digests, slot, _key(signature) or None)
+    return True
+
+
+class SnapshotWriter:
+    """
+    Periodically writes the store to disk when it has changed, plus once on stop.
+    """
+
+    def __init__(
+        self,
+        store: MarketStateStore,
+        program_id: str,
+        path: str = STATE_SNAPSHOT_PATH,
+        interval: float = STATE_SNAPSHOT_INTERVAL_SECONDS,
+    ):
+        self.store = store
+        self.program_id = program_id
+        self.path = path
+        self.interval = interval
+        self._written_version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def write(self):
+        if not self.store.markets and not self.store.positions:
+            return
+        if self.store.version == self._written_version:
+            return
+        version = self.store.version
+        await write_snapshot(self.store, self.program_id, self.path)
+        self._written_version = version
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.write()
+            except Exception as e:
+                print(f"Warning: state snapshot failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._written_version = self.store.version
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.write()
+        except Exception as e:
+            print(f"Warning: state snapshot failed: {e}")
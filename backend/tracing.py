@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Share of requests traced without an admin header (0 disables sampling)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Required in X-Debug-Trace / X-Debug-Profile to force tracing or profiling
+TRACE_ADMIN_TOKEN = os.getenv("TRACE_ADMIN_TOKEN", "")
+TRACE_STORE_SIZE = int(os.getenv("TRACE_STORE_SIZE", "100"))
+
+
+class Trace:
+    """
+    Spans recorded for one request, exportable in Chrome trace-event format
+    (load in chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    def __init__(self, name: str):
+        self.id = secrets.token_hex(8)
+        self.name = name
+        self.wall_start = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.spans: list[tuple[str, int, int, int, dict]] = []
+        self.profile: Optional[pstats.Stats] = None
+
+    def add(self, name: str, start_ns: int, end_ns: int, attrs: dict):
+        task = asyncio.current_task() if _in_loop() else None
+        tid = id(task) % 100000 if task else 0
+        self.spans.append((name, start_ns, end_ns - start_ns, tid, attrs))
+
+    def to_chrome(self) -> dict:
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.start_ns) / 1000,
+                    "dur": dur / 1000,
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": attrs,
+                }
+                for name, start, dur, tid, attrs in self.spans
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.id, "request": self.name, "started": self.wall_start},
+        }
+
+    def profile_text(self, limit: int = 60) -> str:
+        if self.profile is None:
+            return ""
+        out = io.StringIO()
+        self.profile.stream = out
+        self.profile.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_profiling = False
+
+
+def _in_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add(self.name, self.start, time.perf_counter_ns(), self.attrs)
+        return False
+
+
+def span(name: str, **attrs):
+    """
+    Time a block in the current request's trace; a shared no-op when the
+    request is not traced.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, attrs)
+
+
+def traced(name: str):
+    """
+    Decorator putting an async function in a span.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await fn(*args, **kwargs)
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedClient:
+    """
+    Proxy that puts every coroutine method of an RPC client in an "rpc.<method>" span.
+    """
+
+    def __init__(self, target, prefix: str = "rpc"):
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        label = f"{self._prefix}.{name}"
+
+        async def call(*args, **kwargs):
+            if _current.get() is None:
+                return await attr(*args, **kwargs)
+            with span(label):
+                return await attr(*args, **kwargs)
+
+        # Cache so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+def authorized(header_value: Optional[str]) -> bool:
+    return bool(TRACE_ADMIN_TOKEN) and header_value is not None and secrets.compare_digest(header_value, TRACE_ADMIN_TOKEN)
+
+
+def should_sample() -> bool:
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def start_trace(name: str, profile: bool = False):
+    """
+    Begin tracing the current request. Returns (trace, token, profiler).
+    cProfile covers the whole event-loop thread, so a profile also includes
+    whatever else ran during the request; only one request is profiled at a time.
+    """
+    global _profiling
+    trace = Trace(name)
+    token = _current.set(trace)
+    profiler = None
+    if profile and not _profiling:
+        _profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return trace, token, profiler
+
+
+def finish_trace(trace: Trace, token, profiler: Optional[cProfile.Profile]):
+    global _profiling
+    if profiler is not None:
+        profiler.disable()
+        _profiling = False
+        trace.profile = pstats.Stats(profiler)
+    _current.reset(token)
+    _traces[trace.id] = trace
+    while len(_traces) > TRACE_STORE_SIZE:
+        _traces.popitem(last=False)
+
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    return _traces.get(trace_id)
+
+
+def list_traces() -> list[dict]:
+    return [
+        {
+            "trace_id": t.id,
+            "request": t.name,
+            "started": t.wall_start,
+            "spans": len(t.spans),
+            "profiled": t.profile is not None,
+        }
+        for t in reversed(_traces.values())
+    ]
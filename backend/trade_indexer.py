@@ -0,0 +1,373 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+from solders.signature import Signature
+
+from idl_codec import InstructionDecoder, load_instructions
+
+TRADE_DB_PATH = os.getenv("TRADE_DB_PATH", os.path.join(os.path.dirname(__file__), "trades.db"))
+# Concurrent getTransaction calls per signature page
+TRADE_INDEXER_CONCURRENCY = int(os.getenv("TRADE_INDEXER_CONCURRENCY", "8"))
+TRADE_INDEXER_POLL_SECONDS = float(os.getenv("TRADE_INDEXER_POLL_SECONDS", "10"))
+TRADE_INDEXER_PAGE_SIZE = 1000  # getSignaturesForAddress maximum
+# Pages a transaction may fail to fetch in (3 attempts each) before it is
+# recorded as skipped, e.g. when the RPC node has pruned that ledger range
+TRADE_INDEXER_MAX_FETCH_FAILURES = int(os.getenv("TRADE_INDEXER_MAX_FETCH_FAILURES", "5"))
+
+TRADE_FIELDS = (
+    "signature",
+    "slot",
+    "block_time",
+    "instruction",
+    "market",
+    "user",
+    "amount",
+    "side",
+    "outcome",
+    "question",
+)
+
+# Account names (from the IDL) that identify the acting wallet per instruction
+_USER_ACCOUNTS = ("user", "creator", "authority")
+
+
+def encode_cursor(slot: int, signature: str, ix_index: int) -> str:
+    return f"{slot}.{signature}.{ix_index}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, str, int]:
+    slot, signature, ix_index = cursor.split(".")
+    return int(slot), signature, int(ix_index)
+
+
+class TradeStore:
+    """
+    SQLite table of decoded program instructions, indexed by market and user
+    for keyset pagination (newest first), plus the indexer checkpoints.
+    """
+
+    def __init__(self, path: str = TRADE_DB_PATH):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS trades ("
+            "signature TEXT, ix_index INTEGER, slot INTEGER, block_time INTEGER, "
+            "instruction TEXT, market TEXT, user TEXT, amount INTEGER, side TEXT, "
+            "outcome INTEGER, question TEXT, PRIMARY KEY (signature, ix_index))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS trades_market ON trades (market, slot DESC, signature DESC, ix_index DESC)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS trades_user ON trades (user, slot DESC, signature DESC, ix_index DESC)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, signature TEXT, slot INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS skipped (signature TEXT PRIMARY KEY, slot INTEGER, error TEXT)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _insert(self, rows: list[tuple], checkpoints: list[tuple], skipped: list[tuple]):
+        # One transaction per page so a checkpoint never gets ahead of its rows
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO trades (signature, ix_index, slot, block_time, instruction, "
+                    "market, user, amount, side, outcome, question) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.executemany(
+                    "INSERT INTO checkpoints (name, signature, slot) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET signature = excluded.signature, slot = excluded.slot",
+                    checkpoints,
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO skipped (signature, slot, error) VALUES (?, ?, ?)", skipped
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def insert(self, rows: list[tuple], checkpoints: list[tuple], skipped: list[tuple] = ()):
+        """
+        Trade rows, checkpoint updates and skipped (signature, slot, error)
+        entries, written in one transaction.
+        """
+        await asyncio.to_thread(self._insert, rows, checkpoints, list(skipped))
+
+    async def checkpoint(self, name: str) -> Optional[tuple[str, int]]:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT signature, slot FROM checkpoints WHERE name = ?", (name,)
+        )
+        return rows[0] if rows else None
+
+    async def trades(self, column: str, value: str, limit: int, cursor: Optional[str] = None) -> tuple[list[tuple], Optional[str]]:
+        """
+        Page of trades for a market or user, newest first. Returns the rows
+        (TRADE_FIELDS order) and the cursor for the next page, if any.
+        """
+        if column not in ("market", "user"):
+            raise ValueError(f"Unknown trade column: {column}")
+        sql = (
+            "SELECT signature, slot, block_time, instruction, market, user, amount, side, outcome, question, ix_index "
+            f"FROM trades WHERE {column} = ?"
+        )
+        params: tuple = (value,)
+        if cursor:
+            slot, signature, ix_index = decode_cursor(cursor)
+            sql += " AND (slot, signature, ix_index) < (?, ?, ?)"
+            params += (slot, signature, ix_index)
+        sql += " ORDER BY slot DESC, signature DESC, ix_index DESC LIMIT ?"
+        params += (limit + 1,)
+        rows = await asyncio.to_thread(self._execute, sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[1], last[0], last[10])
+        return [
+            row[:8] + (None if row[8] is None else bool(row[8]), row[9])
+            for row in rows
+        ], next_cursor
+
+    async def count(self) -> int:
+        return (await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM trades"))[0][0]
+
+    async def skipped_count(self) -> int:
+        return (await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM skipped"))[0][0]
+
+    def close(self):
+        self._conn.close()
+
+
+class TradeIndexer:
+    """
+    Indexes the program's transaction history into a TradeStore.
+
+    Backfill walks getSignaturesForAddress backwards from the newest
+    signature, fetching each page's transactions concurrently, and
+    checkpoints the oldest signature done so a restart resumes where it
+    stopped. The tail then polls for signatures newer than the "head"
+    checkpoint. Instructions are decoded by their Anchor discriminator using
+    the IDL; accounts are mapped to names by their position in the IDL.
+    """
+
+    def __init__(
+        self,
+        orchestrator,
+        store: TradeStore,
+        concurrency: int = TRADE_INDEXER_CONCURRENCY,
+        poll_interval: float = TRADE_INDEXER_POLL_SECONDS,
+    ):
+        self.orchestrator = orchestrator
+        self.store = store
+        self.decoder = InstructionDecoder(load_instructions(orchestrator.idl_path))
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.counts = {"transactions": 0, "instructions": 0, "failed_fetches": 0, "skipped": 0, "undecodable": 0}
+        self.backfill_done = False
+        # Failed pages per signature, until TRADE_INDEXER_MAX_FETCH_FAILURES
+        self._fetch_failures: dict[str, int] = {}
+
+    async def _signatures(self, before: Optional[str] = None, until: Optional[str] = None) -> list:
+        resp = await self.orchestrator.client.get_signatures_for_address(
+            self.orchestrator.program_id,
+            before=Signature.from_string(before) if before else None,
+            until=Signature.from_string(until) if until else None,
+            limit=TRADE_INDEXER_PAGE_SIZE,
+        )
+        return resp.value
+
+    async def _fetch(self, signature: str):
+        """
+        Raises after three attempts; see _index for what happens next.
+        """
+        async with self._semaphore:
+            for attempt in range(3):
+                try:
+                    resp = await self.orchestrator.client.get_transaction(
+                        Signature.from_string(signature),
+                        encoding="base64",
+                        max_supported_transaction_version=0,
+                    )
+                    if resp.value is None:
+                        raise RuntimeError("transaction not found")
+                    return resp.value
+                except Exception as e:
+                    if attempt == 2:
+                        self.counts["failed_fetches"] += 1
+                        raise RuntimeError(f"could not fetch transaction {signature}: {e}") from e
+                    await asyncio.sleep(0.5 * (attempt + 1))
+
+    def _decode(self, signature: str, fetched) -> list[tuple]:
+        """
+        Rows for every top-level program instruction in one transaction.
+        """
+        tx = fetched.transaction.transaction
+        meta = fetched.transaction.meta
+        message = tx.message
+        keys = [str(k) for k in message.account_keys]
+        if meta is not None and meta.loaded_addresses is not None:
+            keys += [str(k) for k in meta.loaded_addresses.writable]
+            keys += [str(k) for k in meta.loaded_addresses.readonly]
+        program_id = str(self.orchestrator.program_id)
+        rows = []
+        for ix_index, ix in enumerate(message.instructions):
+            if keys[ix.program_id_index] != program_id:
+                continue
+            try:
+                decoded = self.decoder.decode(bytes(ix.data))
+            except Exception:
+                decoded = None
+            if decoded is None:
+                self.counts["undecodable"] += 1
+                continue
+            idl_ix, args = decoded
+            accounts = {name: keys[i] for (name, _, _), i in zip(idl_ix.accounts, bytes(ix.accounts))}
+            user = next((accounts[name] for name in _USER_ACCOUNTS if name in accounts), None)
+            side = None
+            if "bet_on_yes" in args:
+                side = "yes" if args["bet_on_yes"] else "no"
+            outcome = args.get("outcome")
+            rows.append((
+                signature,
+                ix_index,
+                fetched.slot,
+                fetched.block_time,
+                idl_ix.snake_name,
+                accounts.get("market"),
+                user,
+                args.get("amount"),
+                side,
+                None if outcome is None else int(outcome),
+                args.get("question"),
+            ))
+        self.counts["instructions"] += len(rows)
+        return rows
+
+    async def _index(self, signatures: list) -> tuple[list[tuple], list[tuple]]:
+        """
+        Fetch and decode a batch of signatures; transactions that failed on
+        chain are ignored. Returns (rows, skipped). A failed fetch raises so
+        the batch is retried without moving its checkpoint, until the
+        signature has failed TRADE_INDEXER_MAX_FETCH_FAILURES times; then it
+        is returned as skipped and the batch goes through.
+        """
+        wanted = [s for s in signatures if s.err is None]
+        fetched = await asyncio.gather(*(self._fetch(str(s.signature)) for s in wanted), return_exceptions=True)
+        rows, skipped, retry = [], [], []
+        for s, value in zip(wanted, fetched):
+            sig = str(s.signature)
+            if isinstance(value, BaseException):
+                failures = self._fetch_failures[sig] = self._fetch_failures.get(sig, 0) + 1
+                if failures < TRADE_INDEXER_MAX_FETCH_FAILURES:
+                    retry.append(str(value))
+                else:
+                    print(f"Warning: skipping transaction {sig} after {failures} failed fetches: {value}")
+                    skipped.append((sig, s.slot, str(value)))
+                continue
+            rows.extend(self._decode(sig, value))
+        if retry:
+            raise RuntimeError(f"{len(retry)} transaction fetches failed, first: {retry[0]}")
+        for sig, _, _ in skipped:
+            del self._fetch_failures[sig]
+        self.counts["transactions"] += len(wanted) - len(skipped)
+        self.counts["skipped"] += len(skipped)
+        return rows, skipped
+
+    async def backfill(self):
+        done = await self.store.checkpoint("backfill_done")
+        if done is not None:
+            self.backfill_done = True
+            return
+        cursor = await self.store.checkpoint("backfill")
+        before = cursor[0] if cursor else None
+        while True:
+            page = await self._signatures(before=before)
+            if not page:
+                break
+            rows, skipped = await self._index(page)
+            oldest = page[-1]
+            checkpoints = [("backfill", str(oldest.signature), oldest.slot)]
+            if before is None and await self.store.checkpoint("head") is None:
+                # The first page's newest signature is where the tail starts
+                checkpoints.append(("head", str(page[0].signature), page[0].slot))
+            await self.store.insert(rows, checkpoints, skipped)
+            before = str(oldest.signature)
+            if len(page) < TRADE_INDEXER_PAGE_SIZE:
+                break
+        await self.store.insert([], [("backfill_done", before or "", 0)])
+        self.backfill_done = True
+
+    async def tail(self) -> int:
+        """
+        Index signatures newer than the head checkpoint, oldest page first,
+        moving the head after each page. Returns the number of new signatures.
+        """
+        head = await self.store.checkpoint("head")
+        until = head[0] if head else None
+        newer: list = []
+        before = None
+        while True:
+            page = await self._signatures(before=before, until=until)
+            newer.extend(page)
+            if len(page) < TRADE_INDEXER_PAGE_SIZE:
+                break
+            before = str(page[-1].signature)
+        # Newest first from the RPC; index from the oldest so a failed page
+        # leaves the head right behind it
+        newer.reverse()
+        for i in range(0, len(newer), TRADE_INDEXER_PAGE_SIZE):
+            page = newer[i:i + TRADE_INDEXER_PAGE_SIZE]
+            rows, skipped = await self._index(page)
+            await self.store.insert(rows, [("head", str(page[-1].signature), page[-1].slot)], skipped)
+        return len(newer)
+
+    async def _run(self):
+        while not self.backfill_done:
+            try:
+                await self.backfill()
+            except Exception as e:
+                print(f"Warning: trade backfill failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+        while True:
+            try:
+                await self.tail()
+            except Exception as e:
+                print(f"Warning: trade indexer tail failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> dict:
+        head = await self.store.checkpoint("head")
+        return {
+            "backfill_done": self.backfill_done,
+            "head_slot": head[1] if head else None,
+            "indexed_trades": await self.store.count(),
+            "skipped_transactions": await self.store.skipped_count(),
+            **self.counts,
+        }